@@ -0,0 +1,346 @@
+# ============================================================================
+# benchmark.py - Synthetic data generator and benchmark suite
+# ============================================================================
+
+"""Measure how the main operations scale with data size.
+
+A synthetic data set (users with transactions, budgets and savings goals)
+is generated in a scratch directory, then each operation is run
+headlessly through the service layer and timed:
+
+    load_data      reset and read every store from disk
+    save_data      rewrite every loaded store
+    dashboard      services.get_dashboard for a random user and month
+    budget_status  services.get_budget_status for a random user and month
+    dashboard_hit  services.get_dashboard answered from the report cache
+    search         services.search_transactions with a random filter
+    export         services.export_transactions of a random user
+
+dashboard and budget_status run with the report cache disabled, so they
+time the computation; dashboard_hit repeats one cached report.
+
+Latency percentiles, throughput and peak traced memory are printed and
+can be written as JSON to compare runs:
+
+    python benchmark.py --transactions 100000 --json base.json
+    python benchmark.py --transactions 100000 --backend sqlite --compare base.json
+
+Very large runs (millions of transactions) are best done with the SQLite
+backend; the JSON layouts hold every transaction in memory.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+import tracemalloc
+import config
+import data_manager
+import indexes
+import services
+import sqlite_store
+from loadtest import percentile
+
+
+OPERATIONS = ["load_data", "save_data", "dashboard", "budget_status", "dashboard_hit",
+              "search", "export"]
+UNCACHED = ["dashboard", "budget_status"]   # timed with REPORT_CACHE_SIZE = 0
+GENERATE_CHUNK = 50000
+
+
+def month_list(months):
+    """Return the last `months` months (YYYY-MM), oldest first."""
+    year, month = datetime.date.today().year, datetime.date.today().month
+    result = []
+    for _ in range(months):
+        result.append(f"{year:04d}-{month:02d}")
+        year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+    return result[::-1]
+
+
+def generate(num_users, num_transactions, months, seed=0):
+    """Create a synthetic data set in the current directory and return the usernames.
+
+    Transactions are spread evenly over the users and randomly over the
+    months; roughly one in ten is income.
+    """
+    rng = random.Random(seed)
+    month_names = month_list(months)
+    usernames = [f"user{i:05d}" for i in range(num_users)]
+    data_manager.load_data()
+
+    # One hash for everyone: the KDF is deliberately slow
+    password = services.hash_password("bench")
+    goal_number = 0
+    for username in usernames:
+        config.users[username] = {
+            "user_id": f"bench-{username}",
+            "name": username.title(),
+            "password": password,
+            "currency": "USD",
+            "created_date": f"{month_names[0]}-01"
+        }
+        config.budgets[username] = {category: str(rng.randint(100, 2000))
+                                    for category in rng.sample(config.EXPENSE_CATEGORIES, 4)}
+        config.savings_goals[username] = {}
+        for _ in range(2):
+            goal_number += 1
+            goal_id = f"GOAL{goal_number:0{data_manager.ID_LENGTH - 4}d}"
+            config.savings_goals[username][goal_id] = {
+                "goal_id": goal_id,
+                "name": f"Goal {goal_number}",
+                "target": str(rng.randint(1000, 20000)),
+                "current": str(rng.randint(0, 1000)),
+                "deadline": f"{datetime.date.today().year + 1}-12-31",
+                "created_date": f"{month_names[0]}-01"
+            }
+
+    chunk = []
+    for number in range(1, num_transactions + 1):
+        username = usernames[number % num_users]
+        trans_type = "income" if rng.random() < 0.1 else "expense"
+        categories = config.INCOME_CATEGORIES if trans_type == "income" else config.EXPENSE_CATEGORIES
+        chunk.append({
+            "transaction_id": f"TXN{number:0{data_manager.ID_LENGTH - 3}d}",
+            "user_id": f"bench-{username}",
+            "username": username,
+            "type": trans_type,
+            "amount": f"{rng.uniform(1, 3000 if trans_type == 'income' else 300):.2f}",
+            "category": rng.choice(categories),
+            "date": f"{rng.choice(month_names)}-{rng.randint(1, 28):02d}",
+            "description": f"Synthetic transaction {number}",
+            "payment_method": rng.choice(["Cash", "Credit Card", "Debit Card"])
+        })
+        if len(chunk) == GENERATE_CHUNK or number == num_transactions:
+            if config.STORAGE_BACKEND == "sqlite":
+                sqlite_store.save_transactions(chunk)
+            else:
+                config.transactions.update((t["transaction_id"], t) for t in chunk)
+            chunk = []
+
+    if config.STORAGE_BACKEND != "sqlite":
+        indexes.rebuild_indexes()
+    config.loaded_stores = {(store, owner) for owner in owners(usernames)
+                            for store in data_manager.owner_stores(owner)}
+    config.dirty_stores = set(config.loaded_stores)
+    config.changed_keys = {}
+    data_manager.save_data()
+    return usernames
+
+
+def owners(usernames):
+    """Return every store owner of the current layout."""
+    if config.SHARDED and config.STORAGE_BACKEND != "sqlite":
+        return [None] + list(usernames)
+    return [None]
+
+
+def load_everything(usernames):
+    """Reset and read every store from disk."""
+    data_manager.load_data()
+    for owner in owners(usernames):
+        data_manager.load_all(owner)
+
+
+def save_everything():
+    """Rewrite every loaded store."""
+    config.dirty_stores = set(config.loaded_stores)
+    config.changed_keys = {}
+    data_manager.save_data()
+
+
+def make_operations(usernames, months, rng, export_file):
+    """Return {name: callable} for the benchmarked operations."""
+    month_names = month_list(months)
+
+    def search():
+        username = rng.choice(usernames)
+        kind = rng.randrange(3)
+        if kind == 0:
+            start = rng.choice(month_names)
+            return services.search_transactions(username, start_date=f"{start}-01",
+                                                end_date=f"{start}-28")
+        if kind == 1:
+            return services.search_transactions(username,
+                                                category=rng.choice(config.EXPENSE_CATEGORIES))
+        low = rng.randint(1, 200)
+        return services.search_transactions(username, min_amount=low, max_amount=low + 50)
+
+    return {
+        "load_data": lambda: load_everything(usernames),
+        "save_data": save_everything,
+        "dashboard": lambda: services.get_dashboard(rng.choice(usernames), rng.choice(month_names)),
+        "budget_status": lambda: services.get_budget_status(rng.choice(usernames),
+                                                            rng.choice(month_names)),
+        "dashboard_hit": lambda: services.get_dashboard(usernames[0], month_names[-1]),
+        "search": search,
+        "export": lambda: services.export_transactions(rng.choice(usernames), export_file)
+    }
+
+
+def measure(func, repeat):
+    """Run func repeat times; return (latencies in seconds, CPU seconds, peak bytes).
+
+    Peak memory comes from one extra traced run so that tracemalloc's
+    overhead does not distort the timings.
+    """
+    latencies = []
+    cpu_start = time.process_time()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - start)
+    cpu = time.process_time() - cpu_start
+
+    tracemalloc.start()
+    try:
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return latencies, cpu, peak
+
+
+def summarise(latencies, cpu, peak, rows):
+    """Return the reported figures for one operation."""
+    ordered = sorted(latencies)
+    total = sum(ordered)
+    return {
+        "runs": len(ordered),
+        "mean_ms": total / len(ordered) * 1000,
+        "p50_ms": percentile(ordered, 50) * 1000,
+        "p95_ms": percentile(ordered, 95) * 1000,
+        "p99_ms": percentile(ordered, 99) * 1000,
+        "max_ms": ordered[-1] * 1000,
+        "cpu_ms": cpu / len(ordered) * 1000,
+        "ops_per_sec": len(ordered) / total if total else 0.0,
+        "rows_per_sec": rows * len(ordered) / total if rows and total else None,
+        "peak_kb": peak / 1024
+    }
+
+
+def run(args):
+    """Generate the data set, run the selected operations and return the report."""
+    config.STORAGE_BACKEND = args.backend
+    config.SHARDED = args.sharded
+    config.DATA_FORMAT = args.format
+    config.USE_RECORD_FILE = args.record_file
+    config.SYNC_JOURNAL = not args.no_sync
+
+    start = time.perf_counter()
+    tracemalloc.start()
+    usernames = generate(args.users, args.transactions, args.months, args.seed)
+    generate_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    generate_time = time.perf_counter() - start
+
+    rng = random.Random(args.seed + 1)
+    operations = make_operations(usernames, args.months, rng, "benchmark_export.csv")
+    rows_per_op = {"export": args.transactions // args.users}
+    if args.backend != "sqlite":
+        # SQLite keeps transactions in the database rather than loading them
+        rows_per_op.update(load_data=args.transactions, save_data=args.transactions)
+
+    results = {}
+    cache_size = config.REPORT_CACHE_SIZE
+    load_everything(usernames)
+    for name in args.operations:
+        if name not in ("load_data", "save_data"):
+            # Start from the lazily loaded state the application runs in;
+            # the first run of each operation includes reading its stores
+            data_manager.load_data()
+        elif name == "save_data":
+            load_everything(usernames)
+        config.REPORT_CACHE_SIZE = 0 if name in UNCACHED else cache_size
+        if name == "dashboard_hit":
+            operations[name]()
+        repeat = args.repeat if name not in ("load_data", "save_data") else max(1, args.repeat // 10)
+        latencies, cpu, peak = measure(operations[name], repeat)
+        results[name] = summarise(latencies, cpu, peak, rows_per_op.get(name))
+    config.REPORT_CACHE_SIZE = cache_size
+
+    return {
+        "settings": {
+            "users": args.users, "transactions": args.transactions, "months": args.months,
+            "backend": args.backend, "sharded": args.sharded, "format": args.format,
+            "record_file": args.record_file,
+            "repeat": args.repeat, "seed": args.seed
+        },
+        "generate": {"seconds": generate_time, "peak_kb": generate_peak / 1024},
+        "results": results
+    }
+
+
+def print_report(report, baseline=None):
+    """Print the results table, with p50 change against a baseline if given."""
+    settings = report["settings"]
+    print(f"{settings['transactions']:,} transactions, {settings['users']:,} users, "
+          f"backend={settings['backend']}{' sharded' if settings['sharded'] else ''}, "
+          f"format={settings['format']}")
+    print(f"Generated in {report['generate']['seconds']:.2f}s "
+          f"(peak {report['generate']['peak_kb'] / 1024:,.1f} MB)\n")
+
+    print(f"{'Operation':<14} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'ops/s':>10} "
+          f"{'rows/s':>12} {'peak KB':>10}" + (f" {'vs base':>9}" if baseline else ""))
+    print("=" * (80 + (10 if baseline else 0)))
+    for name, result in report["results"].items():
+        rows = f"{result['rows_per_sec']:,.0f}" if result["rows_per_sec"] else "-"
+        line = (f"{name:<14} {result['p50_ms']:>10.2f} {result['p95_ms']:>10.2f} "
+                f"{result['p99_ms']:>10.2f} {result['ops_per_sec']:>10,.1f} {rows:>12} "
+                f"{result['peak_kb']:>10,.0f}")
+        base = (baseline or {}).get("results", {}).get(name)
+        if base and base["p50_ms"]:
+            line += f" {(result['p50_ms'] / base['p50_ms'] - 1) * 100:>+8.1f}%"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the finance manager on synthetic data")
+    parser.add_argument("--transactions", type=int, default=10000)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--months", type=int, default=24)
+    parser.add_argument("--backend", choices=["json", "sqlite"], default="json")
+    parser.add_argument("--sharded", action="store_true")
+    parser.add_argument("--format", choices=["json", "compact", "msgpack"], default="json")
+    parser.add_argument("--record-file", action="store_true")
+    parser.add_argument("--no-sync", action="store_true", help="do not fsync journal appends")
+    parser.add_argument("--repeat", type=int, default=50, help="runs per operation")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--operations", nargs="+", choices=OPERATIONS, default=OPERATIONS)
+    parser.add_argument("--dir", help="directory for the data set (default: a temporary one)")
+    parser.add_argument("--json", help="write the report to this file")
+    parser.add_argument("--compare", help="baseline report to compare p50 latencies with")
+    args = parser.parse_args()
+    args.users = max(1, min(args.users, args.transactions or 1))
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+    output = os.path.abspath(args.json) if args.json else None
+
+    workdir = args.dir or tempfile.mkdtemp(prefix="pfm-bench-")
+    os.makedirs(workdir, exist_ok=True)
+    previous = os.getcwd()
+    os.chdir(workdir)
+    try:
+        report = run(args)
+    finally:
+        os.chdir(previous)
+        sqlite_store.close_connection()
+        if not args.dir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print_report(report, baseline)
+    if output:
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=4)
+        print(f"\nReport written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,14 +5,14 @@
 
 """Monthly budget management functionality."""
 
-import datetime
-from decimal import Decimal
 import config
-from utils import clear_screen, print_header, validate_amount
-from data_manager import save_data
+import services
+from instrumentation import instrumented
+from utils import clear_screen, print_header
 
 
-def set_budget():
+@instrumented
+def set_budget(session):
     """Set monthly budget for categories."""
     clear_screen()
     print_header("SET MONTHLY BUDGET")
@@ -31,66 +31,38 @@ def set_budget():
         return
     
     amount_str = input(f"\nEnter monthly budget for {category}: ").strip()
-    amount = validate_amount(amount_str)
     
-    if not amount:
-        print("❌ Invalid amount!")
+    try:
+        amount = services.set_budget(session.username, category, amount_str)
+    except ValueError as e:
+        print(f"❌ {e}")
         input("\nPress Enter to continue...")
         return
     
-    if config.current_user not in config.budgets:
-        config.budgets[config.current_user] = {}
-    
-    config.budgets[config.current_user][category] = str(amount)
-    save_data()
-    
-    print(f"\n✅ Budget set: {category} = {config.users[config.current_user]['currency']}{amount}")
+    print(f"\n✅ Budget set: {category} = {session.currency}{amount}")
     input("\nPress Enter to continue...")
 
 
-def view_budget_status():
+@instrumented
+def view_budget_status(session):
     """View budget status and spending."""
     clear_screen()
     print_header("BUDGET STATUS")
     
-    if config.current_user not in config.budgets or not config.budgets[config.current_user]:
+    budget_status = services.get_budget_status(session.username)
+    if not budget_status:
         print("No budgets set. Please set budgets first.")
         input("\nPress Enter to continue...")
         return
     
-    user_budgets = config.budgets[config.current_user]
-    current_month = datetime.date.today().strftime("%Y-%m")
-    
-    # Calculate spending per category this month
-    category_spending = {}
-    for tid, trans in config.transactions.items():
-        if (trans["username"] == config.current_user and 
-            trans["type"] == "expense" and 
-            trans["date"].startswith(current_month)):
-            cat = trans["category"]
-            amount = Decimal(trans["amount"])
-            category_spending[cat] = category_spending.get(cat, Decimal("0")) + amount
-    
-    currency = config.users[config.current_user]["currency"]
+    currency = session.currency
+    labels = {"good": "✅ Good", "warning": "⚠️  Warning", "over": "❌ Over"}
     
     print(f"{'Category':<20} {'Budget':>12} {'Spent':>12} {'Remaining':>12} {'Status':<10}")
     print("=" * 75)
     
-    for category, budget_str in user_budgets.items():
-        budget = Decimal(budget_str)
-        spent = category_spending.get(category, Decimal("0"))
-        remaining = budget - spent
-        percentage = (spent / budget * 100) if budget > 0 else 0
-        
-        if percentage <= 80:
-            status = "✅ Good"
-        elif percentage <= 100:
-            status = "⚠️  Warning"
-        else:
-            status = "❌ Over"
-        
-        print(f"{category:<20} {currency}{budget:>10,.2f} {currency}{spent:>10,.2f} "
-              f"{currency}{remaining:>10,.2f} {status:<10}")
+    for row in budget_status:
+        print(f"{row['category']:<20} {currency}{row['budget']:>10,.2f} {currency}{row['spent']:>10,.2f} "
+              f"{currency}{row['remaining']:>10,.2f} {labels[row['status']]:<10}")
     
     input("\nPress Enter to continue...")
-
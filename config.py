@@ -5,18 +5,63 @@
 
 """Configuration and global data storage."""
 
-# Global data storage
+import os
+import threading
+
+# Global data storage, shared by every session and thread of the
+# process; there is no per-session copy. Touch a user's entries only
+# under the lock of their shard and users under data_lock (see
+# services.user_lock).
 users = {}
 transactions = {}
 budgets = {}
 savings_goals = {}
-current_user = None
+loaded_stores = set()
+dirty_stores = set()
+changed_keys = {}    # dirty (store, owner) -> keys changed since the last save
+data_lock = threading.RLock()
+
+# Secondary indexes (rebuilt on load, see indexes.py)
+user_index = {}      # username -> {"dates": [...], "ids": [...]} sorted by date
+monthly_totals = {}  # (username, "YYYY-MM") -> {(type, category): Decimal}
+text_index = {}      # username -> word postings, built on first text search
 
 # File paths
 USERS_FILE = "users.json"
 TRANSACTIONS_FILE = "transactions.json"
 BUDGETS_FILE = "budgets.json"
 GOALS_FILE = "savings_goals.json"
+JOURNAL_FILE = "journal.log"
+RECORDS_FILE = "transactions.rec"
+DATA_DIR = "data"
+DATABASE_FILE = "finance.db"
+COUNTERS_FILE = "counters.json"
+LOCK_FILE = "finance.lock"
+
+# Storage settings
+STORAGE_BACKEND = "json"    # "json" or "sqlite"
+USE_JOURNAL = True
+JOURNAL_COMPACT_THRESHOLD = 500
+SHARDED = False             # one directory per user under DATA_DIR
+SYNC_JOURNAL = True         # fsync every journal append
+DATA_FORMAT = "json"        # "json" (indented), "compact" or "msgpack"
+USE_RECORD_FILE = False     # keep an mmap-able copy of transactions for reports
+SERVER_THREADS = 4          # worker threads running service calls in server.py
+journal_entries = {}
+data_versions = {}          # owner -> stamp of its files when read (see data_manager.refresh)
+
+# Security settings
+PASSWORD_ITERATIONS = 200000  # PBKDF2-SHA256 rounds; older hashes are upgraded on login
+SESSION_TTL = 3600            # seconds a verified login or session token stays valid
+AUTH_CACHE_SIZE = 10000       # verified logins / session tokens kept in memory
+
+# Display settings
+PAGE_SIZE = 20                # transactions per page in the transaction list
+REPORT_CACHE_SIZE = 256       # dashboard/budget/history reports cached in memory (0 disables)
+
+# Instrumentation (see instrumentation.py)
+INSTRUMENT = bool(os.environ.get("PFM_INSTRUMENT"))
+PROFILE_DIR = os.environ.get("PFM_PROFILE_DIR")   # cProfile dump per action
 
 # Categories
 EXPENSE_CATEGORIES = ["Food", "Rent", "Transportation", "Entertainment", "Utilities", 
@@ -5,93 +5,971 @@
 
 """Data loading, saving, and export functionality."""
 
+import contextlib
 import json
 import csv
+import gzip
 import datetime
 import os
 import config
-from utils import clear_screen, print_header
-from decimal import Decimal
+import sqlite_store
+import indexes
+import recordfile
+import report_cache
+from instrumentation import instrumented, add_rows, add_read, add_written
+from utils import clear_screen, print_header, validate_date, validate_username, file_lock
 
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
 
+
+STORES = ["users", "transactions", "budgets", "savings_goals"]
+
+
+def store_owner(store, username):
+    """Return the shard owning a user's part of a store.
+    
+    In the sharded layout transactions, budgets and goals live in one
+    directory per user; users (and everything in the flat layout) belong
+    to the global owner None.
+    """
+    if not config.SHARDED or store == "users" or config.STORAGE_BACKEND == "sqlite":
+        return None
+    return username
+
+
+def shard_dir(owner):
+    """Return the directory holding one user's shard.
+    
+    Usernames are checked on registration; this refuses any other name
+    that would lead outside DATA_DIR.
+    """
+    if not validate_username(owner):
+        raise ValueError(f"Invalid username for a shard: {owner!r}")
+    return os.path.join(config.DATA_DIR, owner)
+
+
+def store_file(store, owner=None):
+    """Return the JSON file backing a store (or one user's shard of it)."""
+    filename = {
+        "users": config.USERS_FILE,
+        "transactions": config.TRANSACTIONS_FILE,
+        "budgets": config.BUDGETS_FILE,
+        "savings_goals": config.GOALS_FILE
+    }[store]
+    if owner is None:
+        return filename
+    return os.path.join(shard_dir(owner), os.path.basename(filename))
+
+
+def journal_file(owner=None):
+    """Return the journal for the global stores or for one user's shard."""
+    if owner is None:
+        return config.JOURNAL_FILE
+    return os.path.join(shard_dir(owner), os.path.basename(config.JOURNAL_FILE))
+
+
+def record_file(owner=None):
+    """Return the fixed-width record file for the global or a shard's transactions."""
+    if owner is None:
+        return config.RECORDS_FILE
+    return os.path.join(shard_dir(owner), os.path.basename(config.RECORDS_FILE))
+
+
+def lock_file(owner=None):
+    """Return the advisory lock file guarding one owner's files."""
+    if owner is None:
+        return config.LOCK_FILE
+    return os.path.join(shard_dir(owner), os.path.basename(config.LOCK_FILE))
+
+
+def owner_lock(owner=None):
+    """Lock one owner's snapshots and journal against other processes."""
+    if owner is not None:
+        os.makedirs(shard_dir(owner), exist_ok=True)
+    return file_lock(lock_file(owner))
+
+
+def owner_stores(owner=None):
+    """Return the stores kept in the flat layout or in one user's shard."""
+    if not config.SHARDED or config.STORAGE_BACKEND == "sqlite":
+        return STORES
+    if owner is None:
+        return ["users"]
+    return STORES[1:]
+
+
+@instrumented
 def load_data():
-    """Load all data from JSON files."""
+    """Reset the stores and load users.
+    
+    Only users are needed for the login screen; every other store is
+    read the first time it is used (see ensure_loaded), so startup time
+    does not grow with transaction history.
+    """
+    for store in STORES:
+        setattr(config, store, {})
+    config.loaded_stores = set()
+    config.dirty_stores = set()
+    config.changed_keys = {}
+    config.journal_entries = {}
+    config.data_versions = {}
+    indexes.rebuild_indexes()
+    report_cache.clear()
+    
+    flat_files = [store_file(store) for store in STORES] + [config.JOURNAL_FILE]
+    has_flat_files = any(os.path.exists(path) for path in flat_files)
+    if config.STORAGE_BACKEND == "sqlite":
+        if not os.path.exists(config.DATABASE_FILE) and has_flat_files:
+            migrate_to_sqlite()
+    elif config.SHARDED and not os.path.exists(config.DATA_DIR) and has_flat_files:
+        migrate_to_shards()
+    
+    ensure_loaded("users")
+
+
+def ensure_loaded(store, username=None):
+    """Load a store (or, when sharded, one user's shard of it) on first use.
+    
+    In the sharded layout username selects the shard; without it only
+    the global stores can be loaded. With the SQLite backend transactions
+    stay in the database and are fetched per query, so only the small
+    stores are read into memory.
+    
+    Read errors are raised and the store stays unloaded, so it is never
+    saved over the file that could not be read.
+    """
+    owner = store_owner(store, username)
+    if (store, owner) in config.loaded_stores:
+        return
+    if store not in owner_stores(owner):
+        return
+    
+    if config.STORAGE_BACKEND == "sqlite":
+        config.data_versions.setdefault(owner, sqlite_store.data_version())
+        loaders = {
+            "users": sqlite_store.load_users,
+            "budgets": sqlite_store.load_budgets,
+            "savings_goals": sqlite_store.load_goals
+        }
+        if store in loaders:
+            setattr(config, store, loaders[store]())
+        config.loaded_stores.add((store, owner))
+        return
+    
+    with owner_lock(owner):
+        config.data_versions.setdefault(owner, files_version(owner))
+        read_store(store, owner)
+
+
+def files_version(owner=None):
+    """Return a stamp of an owner's snapshots and journal that changes when they do."""
+    stamp = []
+    for path in [store_file(store, owner) for store in owner_stores(owner)] + [journal_file(owner)]:
+        try:
+            info = os.stat(path)
+        except FileNotFoundError:
+            stamp.append(None)
+            continue
+        stamp.append((info.st_ino, info.st_size, info.st_mtime_ns))
+    return tuple(stamp)
+
+
+def data_version(owner=None):
+    """Return the stamp of an owner's stored data (see refresh)."""
+    if config.STORAGE_BACKEND == "sqlite":
+        return sqlite_store.data_version()
+    return files_version(owner)
+
+
+def refresh(username=None):
+    """Drop a user's in-memory data if another process has changed it since.
+    
+    The SQLite data_version or, for JSON, the stamp of the owner's
+    snapshots and journal is compared with the one taken when the data
+    was read. On a change the owner's stores, indexes and cached reports
+    are dropped and read again on next use. The caller holds the
+    owner's lock (see services.user_lock).
+    """
+    owner = store_owner("transactions", username)
+    version = data_version(owner)
+    known = config.data_versions.setdefault(owner, version)
+    if known == version:
+        return
+    unload(owner)
+    config.journal_entries.pop(owner, None)
+    config.data_versions[owner] = version
+    if owner is None:
+        ensure_loaded("users")
+
+
+@contextlib.contextmanager
+def writing(owner=None):
+    """Hold an owner's lock while writing, keeping its stamp current.
+    
+    The stamp only moves on if nobody else had changed the files since
+    they were read, so their changes are still picked up by refresh().
+    """
+    with owner_lock(owner):
+        fresh = config.data_versions.get(owner) == files_version(owner)
+        yield
+        if fresh:
+            config.data_versions[owner] = files_version(owner)
+
+
+def read_store(store, owner=None, extra=None):
+    """Read a store's snapshot and journal into memory (lock already held).
+    
+    extra holds records to add on top before indexing, as used by bulk
+    imports. A store that needed journal replay or extra records is
+    marked dirty with those keys so the next snapshot includes them. The
+    store is only marked loaded once everything was read.
+    """
+    data = {}
+    if os.path.exists(store_file(store, owner)):
+        data = read_store_file(store_file(store, owner))
+    replayed = replay_journal(data, store, owner)
+    if extra:
+        data.update(extra)
+    getattr(config, store).update(data)
+    add_rows(len(data))
+    
+    if store == "transactions":
+        indexes.add_transactions(data.values())
+    config.loaded_stores.add((store, owner))
+    if replayed or extra:
+        mark_dirty(store, owner, replayed | set(extra or ()))
+
+
+def mark_dirty(store, owner=None, keys=None):
+    """Mark a store for the next save.
+    
+    keys names the entries that changed; only those are written over
+    the file's current contents, so entries saved by other processes in
+    the meantime are kept. Without keys (or once the whole store is
+    dirty) the in-memory store is written as it is.
+    """
+    dirty = (store, owner)
+    if keys is not None and (dirty not in config.dirty_stores or dirty in config.changed_keys):
+        config.changed_keys.setdefault(dirty, set()).update(keys)
+    else:
+        config.changed_keys.pop(dirty, None)
+    config.dirty_stores.add(dirty)
+
+
+def unload(owner=None):
+    """Forget the in-memory copy of one owner's stores."""
+    report_cache.clear(owner)
+    config.data_versions.pop(owner, None)
+    for store in owner_stores(owner):
+        config.loaded_stores.discard((store, owner))
+        config.dirty_stores.discard((store, owner))
+        config.changed_keys.pop((store, owner), None)
+        if owner is None:
+            setattr(config, store, {})
+            if store == "transactions":
+                indexes.rebuild_indexes()
+        elif store == "transactions":
+            for trans_id in indexes.user_transaction_ids(owner):
+                config.transactions.pop(trans_id, None)
+            indexes.drop_user(owner)
+        else:
+            getattr(config, store).pop(owner, None)
+
+
+def load_all(owner=None):
+    """Load every store of the flat layout, or of one user's shard."""
+    for store in owner_stores(owner):
+        ensure_loaded(store, owner)
+
+
+def shard_subset(store, owner):
+    """Return the part of a loaded store that belongs to one owner."""
+    data = getattr(config, store)
+    if owner is None:
+        return data
+    if store == "transactions":
+        return {tid: data[tid] for tid in indexes.user_transaction_ids(owner)}
+    return {owner: data[owner]} if owner in data else {}
+
+
+def read_store_file(path):
+    """Read a store file, detecting JSON or msgpack from its first byte."""
+    with open(path, 'rb') as f:
+        payload = f.read()
+    add_read(len(payload))
+    if not payload or payload[:1] in b"{[" or payload[:1].isspace():
+        return json.loads(payload or b"{}")
+    if msgpack is None:
+        raise RuntimeError(f"{path} is in msgpack format; install msgpack to read it")
+    return msgpack.unpackb(payload)
+
+
+def write_store_file(path, data):
+    """Write a store in DATA_FORMAT crash-safely: temp file, fsync, rename."""
+    if config.DATA_FORMAT == "msgpack":
+        if msgpack is None:
+            raise RuntimeError("DATA_FORMAT 'msgpack' needs the msgpack package")
+        payload = msgpack.packb(data)
+    elif config.DATA_FORMAT == "compact":
+        payload = json.dumps(data, separators=(',', ':')).encode()
+    else:
+        payload = json.dumps(data, indent=4).encode()
+    
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    add_written(len(payload))
+
+
+@instrumented
+def save_data(owners=None):
+    """Save the loaded stores that changed, optionally only some owners'.
+    
+    Returns True on success. Stores that were never read or have not
+    changed since they were loaded are left untouched on disk.
+    """
+    dirty = [(store, shard) for store, shard in list(config.loaded_stores)
+             if (store, shard) in config.dirty_stores
+             and (owners is None or shard in owners)]
+    
+    if config.STORAGE_BACKEND == "sqlite":
+        stores = {store: getattr(config, store) if (store, None) in dirty else {}
+                  for store in STORES}
+        try:
+            sqlite_store.save_all(stores["users"], stores["transactions"],
+                                  stores["budgets"], stores["savings_goals"])
+        except Exception as e:
+            print(f"Error saving data: {e}")
+            return False
+        config.dirty_stores.difference_update(dirty)
+        for key in dirty:
+            config.changed_keys.pop(key, None)
+        return True
+    
     try:
-        if os.path.exists(config.USERS_FILE):
-            with open(config.USERS_FILE, 'r') as f:
-                config.users = json.load(f)
-        
-        if os.path.exists(config.TRANSACTIONS_FILE):
-            with open(config.TRANSACTIONS_FILE, 'r') as f:
-                config.transactions = json.load(f)
-        
-        if os.path.exists(config.BUDGETS_FILE):
-            with open(config.BUDGETS_FILE, 'r') as f:
-                config.budgets = json.load(f)
-        
-        if os.path.exists(config.GOALS_FILE):
-            with open(config.GOALS_FILE, 'r') as f:
-                config.savings_goals = json.load(f)
-                
+        for owner in {shard for _, shard in dirty}:
+            save_owner(owner)
     except Exception as e:
-        print(f"Error loading data: {e}")
+        print(f"Error saving data: {e}")
+        return False
+    return True
+
+
+def save_owner(owner=None):
+    """Save one owner's changed stores under its lock, raising any error."""
+    with writing(owner):
+        write_stores([(store, shard) for store, shard in list(config.dirty_stores)
+                      if shard == owner and (store, shard) in config.loaded_stores])
+
+
+def write_stores(keys):
+    """Write (store, owner) snapshots and clear their dirty flags (lock held).
+    
+    A store with known changed keys is re-read from disk first and only
+    those entries are replaced, so another process's saves since this
+    one loaded the store are not overwritten.
+    """
+    for store, shard in keys:
+        changed = config.changed_keys.get((store, shard))
+        if changed is None:
+            data = shard_subset(store, shard)
+        else:
+            data = merge_changes(store, shard, changed)
+        write_store_file(store_file(store, shard), data)
+        config.dirty_stores.discard((store, shard))
+        config.changed_keys.pop((store, shard), None)
+        if store == "transactions" and config.USE_RECORD_FILE:
+            write_record_file(shard, None if changed is None else data)
+
+
+def merge_changes(store, owner, keys):
+    """Return an owner's store as on disk with this process's changed keys applied."""
+    data = {}
+    if os.path.exists(store_file(store, owner)):
+        data = read_store_file(store_file(store, owner))
+    replay_journal(data, store, owner)
+    current = getattr(config, store)
+    for key in keys:
+        if key in current:
+            data[key] = current[key]
+        else:
+            data.pop(key, None)
+    return data
+
+
+def write_record_file(owner=None, transactions=None):
+    """Write the record file (lock held).
+    
+    transactions ({id: transaction}) defaults to the loaded ones.
+    """
+    if transactions is None:
+        usernames = list(config.user_index) if owner is None else [owner]
+        users = ((username, [config.transactions[tid]
+                             for tid in indexes.user_transaction_ids(username)])
+                 for username in usernames)
+    else:
+        by_user = {}
+        for trans in sorted(transactions.values(),
+                            key=lambda t: (t["date"], t["transaction_id"])):
+            by_user.setdefault(trans["username"], []).append(trans)
+        users = by_user.items()
+    recordfile.write(record_file(owner), users)
+
+
+def records_usable(username):
+    """Return True if a user's reports can be read from the record file.
+    
+    That is the case when the user's transactions have not been loaded
+    into memory and the record file is at least as new as the snapshot
+    with no transaction changes waiting in the journal.
+    """
+    owner = store_owner("transactions", username)
+    if (not config.USE_RECORD_FILE or config.STORAGE_BACKEND == "sqlite"
+            or ("transactions", owner) in config.loaded_stores):
+        return False
+    return records_fresh(owner)
+
+
+def records_fresh(owner=None):
+    """Return True if the record file reflects all of an owner's transactions."""
+    path = record_file(owner)
+    snapshot = store_file("transactions", owner)
+    if not os.path.exists(path):
+        return False
+    if os.path.exists(snapshot) and os.path.getmtime(snapshot) > os.path.getmtime(path):
+        return False
+    if os.path.exists(journal_file(owner)):
+        with open(journal_file(owner), 'r') as f:
+            if any('"s":"transactions"' in line for line in f):
+                return False
+    return True
+
+
+def record_change(store, key, username=None, old=None):
+    """Persist one added, edited or deleted record of a store.
+    
+    store is the name of the config dict ("users", "transactions",
+    "budgets" or "savings_goals") and key the entry that changed;
+    username names the record's owner for transactions, while budgets
+    and goals are keyed by their owner already. In journal mode a
+    single compact line is appended instead of rewriting every file; a
+    key missing from the store is journaled as a delete.
+    
+    old is the entry as it was before the change (None if it was just
+    added). If the change cannot be written the entry is put back to
+    old and the error is raised.
+    """
+    if store in ("budgets", "savings_goals"):
+        username = key
+    if store == "budgets":
+        report_cache.invalidate_report(username, "budget_status")
+    owner = store_owner(store, username)
+    ensure_loaded(store, username)
+    try:
+        if config.STORAGE_BACKEND == "sqlite":
+            sqlite_store.save_record(store, key, getattr(config, store).get(key))
+            return
+        if not config.USE_JOURNAL:
+            mark_dirty(store, owner, {key})
+            save_owner(owner)
+            return
+        append_journal(store, key, owner)
+    except Exception:
+        # Keep memory in line with what was saved
+        if old is None:
+            getattr(config, store).pop(key, None)
+        else:
+            getattr(config, store)[key] = old
+        config.changed_keys.get((store, owner), set()).discard(key)
+        raise
+    
+    mark_dirty(store, owner, {key})
+    if journal_count(owner) >= config.JOURNAL_COMPACT_THRESHOLD:
+        try:
+            compact_journal(owner)
+        except Exception as e:
+            # The change is already safe in the journal; compaction is retried next time
+            print(f"Error compacting journal: {e}")
+
+
+def append_journal(store, key, owner=None):
+    """Append one store entry to an owner's journal, synced to disk."""
+    entry = {"s": store, "k": key, "v": getattr(config, store).get(key)}
+    line = (json.dumps(entry, separators=(',', ':')) + "\n").encode()
+    count = journal_count(owner)
+    with writing(owner):
+        with open(journal_file(owner), 'ab+') as f:
+            # Start on a fresh line if a previous append was cut short
+            if f.seek(0, os.SEEK_END) > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    line = b"\n" + line
+            f.write(line)
+            f.flush()
+            if config.SYNC_JOURNAL:
+                os.fsync(f.fileno())
+    add_written(len(line))
+    config.journal_entries[owner] = count + 1
+
+
+def journal_count(owner=None):
+    """Return the number of entries in a journal, counting it on first use."""
+    if owner not in config.journal_entries:
+        count = 0
+        if os.path.exists(journal_file(owner)):
+            with open(journal_file(owner), 'r') as f:
+                count = sum(1 for _ in f)
+        config.journal_entries[owner] = count
+    return config.journal_entries[owner]
+
+
+def replay_journal(data, store, owner=None):
+    """Apply journaled changes for one store on top of its snapshot.
+    
+    Returns the set of keys the applied entries changed.
+    """
+    if not os.path.exists(journal_file(owner)):
+        return set()
+    
+    applied = set()
+    add_read(os.path.getsize(journal_file(owner)))
+    with open(journal_file(owner), 'r') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # A line torn by an interrupted append
+                continue
+            if entry["s"] != store:
+                continue
+            if entry["v"] is None:
+                data.pop(entry["k"], None)
+            else:
+                data[entry["k"]] = entry["v"]
+            applied.add(entry["k"])
+    return applied
+
+
+def compact_journal(owner=None, new_transactions=None):
+    """Fold one journal into fresh snapshots of its stores.
+    
+    Runs under the owner's lock and re-reads snapshot and journal first,
+    so entries appended by other processes are kept. new_transactions
+    ({id: transaction}) are added before writing, which lets a bulk
+    import land in the same single write. Errors are raised to the
+    caller; the journal is only emptied once the snapshots are written.
+    """
+    with owner_lock(owner):
+        unload(owner)
+        for store in owner_stores(owner):
+            read_store(store, owner, new_transactions if store == "transactions" else None)
+            # Just read under this lock, so the stores are written whole
+            config.changed_keys.pop((store, owner), None)
+        write_stores([(store, owner) for store in owner_stores(owner)
+                      if (store, owner) in config.dirty_stores])
+        if (config.USE_RECORD_FILE and "transactions" in owner_stores(owner)
+                and not records_fresh(owner)):
+            write_record_file(owner)
+        open(journal_file(owner), 'w').close()
+        config.journal_entries[owner] = 0
+        config.data_versions[owner] = files_version(owner)
 
 
-def save_data():
-    """Save all data to JSON files."""
+def migrate_to_sqlite():
+    """Copy the JSON files (including the journal) into the database."""
+    config.STORAGE_BACKEND = "json"
     try:
-        with open(config.USERS_FILE, 'w') as f:
-            json.dump(config.users, f, indent=4)
-        
-        with open(config.TRANSACTIONS_FILE, 'w') as f:
-            json.dump(config.transactions, f, indent=4)
+        load_flat_layout()
+    finally:
+        config.STORAGE_BACKEND = "sqlite"
+    save_data()
+    load_data()
+
+
+def migrate_to_shards():
+    """Split the flat JSON files into one directory per user."""
+    load_flat_layout()
+    
+    owners = set(config.users) | set(config.budgets) | set(config.savings_goals)
+    owners |= {t["username"] for t in config.transactions.values()}
+    config.loaded_stores = {("users", None)} | {
+        (store, owner) for store in STORES[1:] for owner in owners}
+    config.dirty_stores = set(config.loaded_stores)
+    config.changed_keys = {}
+    if save_data():
+        for path in [store_file(store) for store in STORES[1:]] + [config.JOURNAL_FILE]:
+            if os.path.exists(path):
+                os.remove(path)
+    load_data()
+
+
+def migrate_format(data_format):
+    """Rewrite every JSON store (all shards included) in a new format."""
+    if data_format not in ("json", "compact", "msgpack"):
+        raise ValueError(f"Unknown data format: {data_format}")
+    if config.STORAGE_BACKEND == "sqlite":
+        raise ValueError("Data formats apply to the JSON backend only")
+    
+    load_data()
+    load_all()
+    if config.SHARDED:
+        owners = set(config.users)
+        if os.path.isdir(config.DATA_DIR):
+            owners |= set(os.listdir(config.DATA_DIR))
+        for owner in owners:
+            load_all(owner)
+    
+    config.DATA_FORMAT = data_format
+    config.dirty_stores = set(config.loaded_stores)
+    config.changed_keys = {}
+    return save_data()
+
+
+def load_flat_layout():
+    """Load every store of the flat JSON layout into memory."""
+    sharded, config.SHARDED = config.SHARDED, False
+    try:
+        config.loaded_stores = set()
+        for store in STORES:
+            setattr(config, store, {})
+        indexes.rebuild_indexes()
+        load_all()
+        config.dirty_stores = set(config.loaded_stores)
+        config.changed_keys = {}
+    finally:
+        config.SHARDED = sharded
+
+
+def get_transaction(trans_id, username=None):
+    """Return a transaction by id, or None if it does not exist.
+    
+    In the sharded layout username's shard is loaded first; only the
+    loaded users' shards are searched.
+    """
+    ensure_loaded("transactions", username)
+    if config.STORAGE_BACKEND == "sqlite":
+        return sqlite_store.get_transaction(trans_id)
+    return config.transactions.get(trans_id)
+
+
+ID_LENGTH = 12  # characters in a new id, prefix included (TXN + 9 digits)
+
+
+def next_ids(prefix, count=1):
+    """Allocate count new ids such as TXN000000042 from a persisted counter.
+    
+    The counter lives in COUNTERS_FILE and is updated under a file lock,
+    so ids are never reused after a delete and concurrent processes get
+    distinct, increasing ids. Ids are zero-padded to ID_LENGTH, so they
+    also sort in creation order (up to a billion of each kind); ids made
+    before the padding was widened keep their shorter form. Each call is
+    O(1) once the counter exists.
+    """
+    with file_lock(config.COUNTERS_FILE + ".lock"):
+        try:
+            with open(config.COUNTERS_FILE, 'r') as f:
+                counters = json.load(f)
+        except (OSError, ValueError):
+            counters = {}
         
-        with open(config.BUDGETS_FILE, 'w') as f:
-            json.dump(config.budgets, f, indent=4)
+        last = counters.get(prefix)
+        if last is None:
+            last = _highest_existing_id(prefix)
+        counters[prefix] = last + count
         
-        with open(config.GOALS_FILE, 'w') as f:
-            json.dump(config.savings_goals, f, indent=4)
-            
-    except Exception as e:
-        print(f"Error saving data: {e}")
+        tmp_file = config.COUNTERS_FILE + ".tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(counters, f)
+        os.replace(tmp_file, config.COUNTERS_FILE)
+    
+    width = ID_LENGTH - len(prefix)
+    return [prefix + str(number).zfill(width) for number in range(last + 1, last + count + 1)]
+
+
+def _highest_existing_id(prefix):
+    """Return the largest number used by existing ids with the prefix."""
+    store = "savings_goals" if prefix == "GOAL" else "transactions"
+    ensure_loaded(store)
+    
+    if config.SHARDED and config.STORAGE_BACKEND != "sqlite":
+        # Other threads may be using the loaded shards, so read the files
+        with config.data_lock:
+            usernames = list(config.users)
+        ids = (record_id for username in usernames for record_id in shard_ids(store, username))
+    elif prefix == "GOAL":
+        ids = (goal_id for goals in config.savings_goals.values() for goal_id in goals)
+    elif config.STORAGE_BACKEND == "sqlite":
+        ids = sqlite_store.transaction_ids()
+    else:
+        ids = config.transactions.keys()
+    
+    highest = 0
+    for existing in ids:
+        suffix = existing[len(prefix):]
+        if existing.startswith(prefix) and suffix.isdigit():
+            highest = max(highest, int(suffix))
+    return highest
+
+
+def shard_ids(store, owner):
+    """Return the transaction or goal ids on disk in one user's shard."""
+    if not os.path.isdir(shard_dir(owner)):
+        return []
+    data = {}
+    with owner_lock(owner):
+        if os.path.exists(store_file(store, owner)):
+            data = read_store_file(store_file(store, owner))
+        replay_journal(data, store, owner)
+    if store == "savings_goals":
+        return [goal_id for goals in data.values() for goal_id in goals]
+    return list(data)
+
+
+def get_user_transactions(username, start_date=None, end_date=None,
+                          category=None, trans_type=None, newest_first=False):
+    """Return a user's transactions in date order, optionally filtered.
+    
+    Dates are inclusive YYYY-MM-DD bounds and the category match is
+    case-insensitive.
+    """
+    return list(iter_user_transactions(username, start_date, end_date,
+                                       category, trans_type, newest_first))
+
+
+def iter_user_transactions(username, start_date=None, end_date=None,
+                           category=None, trans_type=None, newest_first=False):
+    """Yield a user's transactions lazily; see get_user_transactions()."""
+    ensure_loaded("transactions", username)
+    if config.STORAGE_BACKEND == "sqlite":
+        yield from sqlite_store.iter_transactions(username, start_date, end_date,
+                                                  category, trans_type, newest_first)
+        return
+    
+    trans_ids = indexes.user_transaction_ids(username, start_date, end_date)
+    add_rows(len(trans_ids))
+    if newest_first:
+        trans_ids.reverse()
+    
+    category = category.lower() if category else None
+    for tid in trans_ids:
+        t = config.transactions[tid]
+        if ((not category or t["category"].lower() == category)
+                and (not trans_type or t["type"] == trans_type)):
+            yield t
+
+
+def get_transaction_page(username, count, before=None, after=None):
+    """Return one page of a user's transactions, newest first.
+    
+    The page is positioned by a cursor rather than an offset, so only
+    its own rows are read. before is a (date, transaction_id) key and
+    the page holds the count transactions just older than it; with an
+    id of None it starts at the newest transaction on or before that
+    date. after is the key of a row and the page holds the count
+    transactions just newer than it. With neither, the newest page.
+    """
+    ensure_loaded("transactions", username)
+    if config.STORAGE_BACKEND == "sqlite":
+        if after is not None:
+            return sqlite_store.transaction_page(username, count, after=after)[::-1]
+        return sqlite_store.transaction_page(username, count, before=before)
+    
+    if after is not None:
+        trans_ids = indexes.transaction_ids_after(username, count, *after)
+    else:
+        trans_ids = indexes.transaction_ids_before(username, count, *(before or ()))
+    add_rows(len(trans_ids))
+    return [config.transactions[tid] for tid in reversed(trans_ids)]
+
+
+def store_transaction(transaction):
+    """Add or replace a transaction and persist it, raising if it cannot be saved."""
+    ensure_loaded("transactions", transaction["username"])
+    trans_id = transaction["transaction_id"]
+    old = get_transaction(trans_id, transaction["username"])
+    report_cache.invalidate_months(transaction["username"], {transaction["date"][:7]}
+                                   | ({old["date"][:7]} if old else set()))
+    if config.STORAGE_BACKEND == "sqlite":
+        sqlite_store.save_record("transactions", trans_id, transaction)
+        # Rows are not held in memory; only the word index needs updating
+        if old is not None:
+            indexes.unindex_text(old)
+        indexes.index_text(transaction)
+        return
+    
+    if old is not None:
+        indexes.unindex_transaction(old)
+    config.transactions[trans_id] = transaction
+    indexes.index_transaction(transaction)
+    try:
+        record_change("transactions", trans_id, transaction["username"], old)
+    except Exception:
+        indexes.unindex_transaction(transaction)
+        if old is not None:
+            indexes.index_transaction(old)
+        raise
+
+
+def store_transactions(transactions):
+    """Add a batch of new transactions with a single persistence write.
+    
+    Raises if the batch could not be saved, in which case none of it is
+    kept.
+    """
+    usernames = {t["username"] for t in transactions}
+    for username in usernames:
+        ensure_loaded("transactions", username)
+        report_cache.invalidate_months(username, {t["date"][:7] for t in transactions
+                                                  if t["username"] == username})
+    
+    if config.STORAGE_BACKEND == "sqlite":
+        sqlite_store.save_transactions(transactions)
+        for trans in transactions:
+            indexes.index_text(trans)
+        return
+    
+    owners = {store_owner("transactions", username) for username in usernames}
+    if config.USE_JOURNAL:
+        # Compaction re-reads the stores from disk, so the batch is
+        # handed over rather than applied to memory first
+        for owner in owners:
+            try:
+                compact_journal(owner, {t["transaction_id"]: t for t in transactions
+                                        if store_owner("transactions", t["username"]) == owner})
+            except Exception:
+                # Drop the half-applied batch; the next use re-reads the files
+                unload(owner)
+                raise
+        return
+    
+    for trans in transactions:
+        config.transactions[trans["transaction_id"]] = trans
+        indexes.index_transaction(trans)
+    for owner in owners:
+        mark_dirty("transactions", owner,
+                   {t["transaction_id"] for t in transactions
+                    if store_owner("transactions", t["username"]) == owner})
+    if not save_data(owners):
+        # Take the batch back out so it is not saved later by accident
+        for trans in transactions:
+            del config.transactions[trans["transaction_id"]]
+            indexes.unindex_transaction(trans)
+        raise OSError("The transactions could not be saved")
+
+
+def remove_transaction(trans_id, username=None):
+    """Delete a transaction and persist the deletion, raising if it cannot be saved."""
+    old = get_transaction(trans_id, username)
+    if old is None:
+        return
+    report_cache.invalidate_months(old["username"], {old["date"][:7]})
+    
+    if config.STORAGE_BACKEND == "sqlite":
+        sqlite_store.save_record("transactions", trans_id, None)
+        indexes.unindex_text(old)
+        return
+    
+    del config.transactions[trans_id]
+    indexes.unindex_transaction(old)
+    try:
+        record_change("transactions", trans_id, old["username"], old)
+    except Exception:
+        indexes.index_transaction(old)
+        raise
+
+
+def get_month_totals(username, month):
+    """Return {(type, category): Decimal total} for a user's YYYY-MM month."""
+    if records_usable(username):
+        return recordfile.month_totals(record_file(store_owner("transactions", username)),
+                                       username, month)
+    ensure_loaded("transactions", username)
+    if config.STORAGE_BACKEND == "sqlite":
+        return sqlite_store.month_totals(username, month)
+    return indexes.month_totals(username, month)
 
 
-def export_to_csv():
+def get_monthly_totals(username, start_month=None, end_month=None):
+    """Return {month: {(type, category): Decimal total}} for a user's months.
+    
+    Only months with transactions appear. These come from aggregates
+    kept up to date as transactions change (by indexes.py in memory, by
+    triggers in SQLite); the record file groups its rows in one pass.
+    """
+    if records_usable(username):
+        return recordfile.monthly_totals(record_file(store_owner("transactions", username)),
+                                         username, start_month, end_month)
+    ensure_loaded("transactions", username)
+    if config.STORAGE_BACKEND == "sqlite":
+        return sqlite_store.monthly_totals(username, start_month, end_month)
+    return indexes.user_monthly_totals(username, start_month, end_month)
+
+
+CSV_FIELDS = ['transaction_id', 'date', 'type', 'category',
+              'amount', 'description', 'payment_method']
+
+
+def write_csv(username, filename, start_date=None, end_date=None,
+              category=None, compress=False):
+    """Stream a user's transactions to a CSV file in date order.
+    
+    Rows are written one at a time from the date index, so memory use
+    does not grow with history. Returns the number of rows written.
+    """
+    if compress:
+        csvfile = gzip.open(filename, 'wt', newline='')
+    else:
+        csvfile = open(filename, 'w', newline='', buffering=1 << 16)
+    
+    count = 0
+    with csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(CSV_FIELDS)
+        for trans in iter_user_transactions(username, start_date, end_date, category):
+            writer.writerow([trans[field] for field in CSV_FIELDS])
+            count += 1
+    add_written(os.path.getsize(filename))
+    return count
+
+
+@instrumented
+def export_to_csv(session):
     """Export transactions to CSV file."""
     clear_screen()
     print_header("EXPORT TO CSV")
     
-    user_transactions = {tid: t for tid, t in config.transactions.items() 
-                        if t["username"] == config.current_user}
+    print("Leave blank to export everything")
+    start_date = input("Start date (YYYY-MM-DD): ").strip() or None
+    end_date = input("End date (YYYY-MM-DD): ").strip() or None
     
-    if not user_transactions:
-        print("No transactions to export.")
+    if (start_date and not validate_date(start_date)) or (end_date and not validate_date(end_date)):
+        print("❌ Invalid date format!")
         input("\nPress Enter to continue...")
         return
     
-    filename = f"transactions_{config.current_user}_{datetime.date.today()}.csv"
+    category = input("Category: ").strip() or None
+    compress = input("Compress with gzip? (yes/no) [no]: ").strip().lower() == "yes"
+    
+    filename = f"transactions_{session.username}_{datetime.date.today()}.csv"
+    if compress:
+        filename += ".gz"
     
     try:
-        with open(filename, 'w', newline='') as csvfile:
-            fieldnames = ['transaction_id', 'date', 'type', 'category', 
-                         'amount', 'description', 'payment_method']
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            
-            writer.writeheader()
-            for tid, trans in user_transactions.items():
-                writer.writerow({
-                    'transaction_id': trans['transaction_id'],
-                    'date': trans['date'],
-                    'type': trans['type'],
-                    'category': trans['category'],
-                    'amount': trans['amount'],
-                    'description': trans['description'],
-                    'payment_method': trans['payment_method']
-                })
+        count = write_csv(session.username, filename, start_date, end_date,
+                          category, compress)
         
-        print(f"✅ Transactions exported to {filename}")
+        if count:
+            print(f"✅ {count} transaction(s) exported to {filename}")
+        else:
+            os.remove(filename)
+            print("No transactions to export.")
     except Exception as e:
         print(f"❌ Export failed: {e}")
     
     input("\nPress Enter to continue...")
-
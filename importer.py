@@ -0,0 +1,202 @@
+# ============================================================================
+# importer.py - Bulk transaction import
+# ============================================================================
+
+"""Bulk import of bank statements in CSV or OFX format."""
+
+import csv
+import os
+import re
+from decimal import Decimal, InvalidOperation
+import config
+from utils import clear_screen, print_header, validate_amount, validate_date
+from data_manager import store_transactions, next_ids
+from instrumentation import instrumented, add_rows, add_read
+import services
+
+
+CHUNK_SIZE = 5000
+
+# Header names accepted for each field (compared in lower case)
+CSV_COLUMNS = {
+    "date": ["date", "transaction date", "posted date", "booking date"],
+    "amount": ["amount", "value", "transaction amount"],
+    "type": ["type", "transaction type"],
+    "category": ["category"],
+    "description": ["description", "memo", "payee", "name", "details"],
+    "payment_method": ["payment_method", "payment method", "method"]
+}
+
+# Bank category names mapped onto the application's categories
+CATEGORY_ALIASES = {
+    "groceries": "Food", "restaurants": "Food", "dining": "Food",
+    "housing": "Rent", "mortgage": "Rent",
+    "transport": "Transportation", "travel": "Transportation", "fuel": "Transportation",
+    "bills": "Utilities", "phone": "Utilities", "internet": "Utilities",
+    "medical": "Healthcare", "pharmacy": "Healthcare",
+    "payroll": "Salary", "wages": "Salary",
+    "dividends": "Investment", "interest": "Investment"
+}
+
+OFX_FIELD = re.compile(r"<(TRNTYPE|DTPOSTED|TRNAMT|NAME|MEMO)>([^<\r\n]*)", re.IGNORECASE)
+
+
+def map_category(name, trans_type):
+    """Map a bank category onto a known category for the transaction type."""
+    categories = config.INCOME_CATEGORIES if trans_type == "income" else config.EXPENSE_CATEGORIES
+    name = (name or "").strip()
+    for category in categories:
+        if category.lower() == name.lower():
+            return category
+    alias = CATEGORY_ALIASES.get(name.lower())
+    return alias if alias in categories else "Other"
+
+
+def read_csv_rows(filename):
+    """Yield raw rows from a bank CSV file as field dicts."""
+    with open(filename, 'r', newline='', encoding='utf-8-sig') as f:
+        reader = csv.reader(f)
+        header = [h.strip().lower() for h in next(reader, [])]
+        positions = {}
+        for field, names in CSV_COLUMNS.items():
+            for name in names:
+                if name in header:
+                    positions[field] = header.index(name)
+                    break
+        if "date" not in positions or "amount" not in positions:
+            raise ValueError("CSV file needs 'date' and 'amount' columns")
+
+        for row in reader:
+            yield {field: row[pos] if pos < len(row) else ""
+                   for field, pos in positions.items()}
+
+
+def read_ofx_rows(filename):
+    """Yield raw rows from the STMTTRN blocks of an OFX file."""
+    buffer = ""
+    with open(filename, 'r', encoding='utf-8', errors='replace') as f:
+        for line in f:
+            buffer += line
+            while True:
+                start = buffer.upper().find("<STMTTRN>")
+                end = buffer.upper().find("</STMTTRN>", start)
+                if start < 0 or end < 0:
+                    break
+                fields = {key.upper(): value.strip()
+                          for key, value in OFX_FIELD.findall(buffer[start:end])}
+                buffer = buffer[end + len("</STMTTRN>"):]
+                posted = fields.get("DTPOSTED", "")[:8]
+                yield {
+                    "date": f"{posted[:4]}-{posted[4:6]}-{posted[6:8]}",
+                    "amount": fields.get("TRNAMT", ""),
+                    "description": fields.get("NAME") or fields.get("MEMO", ""),
+                    "type": "income" if fields.get("TRNTYPE", "").upper() == "CREDIT" else ""
+                }
+            if "<STMTTRN>" not in buffer.upper():
+                buffer = ""
+
+
+def build_transactions(rows, username, errors, start_line):
+    """Validate a chunk of raw rows and turn the valid ones into transactions."""
+    user_id = services.get_user(username)["user_id"]
+    checked_dates = {}
+    transactions = []
+
+    for line, row in enumerate(rows, start_line):
+        date_str = row.get("date", "").strip()
+        if date_str not in checked_dates:
+            checked_dates[date_str] = validate_date(date_str)
+        if not checked_dates[date_str]:
+            errors.append(f"Row {line}: invalid date '{date_str}'")
+            continue
+
+        raw_amount = row.get("amount", "").strip().replace(",", "")
+        try:
+            signed = Decimal(raw_amount)
+        except InvalidOperation:
+            errors.append(f"Row {line}: invalid amount '{raw_amount}'")
+            continue
+        amount = validate_amount(str(abs(signed)))
+        if not amount:
+            errors.append(f"Row {line}: invalid amount '{raw_amount}'")
+            continue
+
+        trans_type = row.get("type", "").strip().lower()
+        if trans_type not in ("income", "expense"):
+            trans_type = "expense" if signed < 0 else "income"
+
+        transactions.append({
+            "transaction_id": None,
+            "user_id": user_id,
+            "username": username,
+            "type": trans_type,
+            "amount": str(amount),
+            "category": map_category(row.get("category"), trans_type),
+            "date": date_str,
+            "description": row.get("description", "").strip() or "No description",
+            "payment_method": row.get("payment_method", "").strip() or "Bank Transfer"
+        })
+
+    if transactions:
+        for trans, trans_id in zip(transactions, next_ids("TXN", len(transactions))):
+            trans["transaction_id"] = trans_id
+    return transactions
+
+
+def import_file(filename, username):
+    """Import a CSV or OFX statement for a user.
+
+    Rows are read and validated in chunks of CHUNK_SIZE and the whole
+    batch is persisted with a single write. Returns (imported, errors);
+    raises, with nothing imported, if the batch cannot be saved.
+    """
+    add_read(os.path.getsize(filename))
+    if filename.lower().endswith((".ofx", ".qfx")):
+        rows = read_ofx_rows(filename)
+    else:
+        rows = read_csv_rows(filename)
+
+    errors = []
+    batch = []
+    chunk = []
+    line = 1
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == CHUNK_SIZE:
+            batch.extend(build_transactions(chunk, username, errors, line))
+            line += len(chunk)
+            chunk = []
+    if chunk:
+        batch.extend(build_transactions(chunk, username, errors, line))
+
+    add_rows(len(batch) + len(errors))
+    if batch:
+        store_transactions(batch)
+    return len(batch), errors
+
+
+@instrumented
+def import_transactions(session):
+    """Import transactions from a bank statement file."""
+    clear_screen()
+    print_header("IMPORT TRANSACTIONS")
+
+    print("Supported formats: CSV (with date and amount columns), OFX")
+    filename = input("\nEnter file path: ").strip()
+
+    try:
+        imported, errors = services.import_transactions(session.username, filename)
+    except Exception as e:
+        print(f"❌ Import failed: {e}")
+        input("\nPress Enter to continue...")
+        return
+
+    print(f"\n✅ Imported {imported} transaction(s)")
+    if errors:
+        print(f"⚠️  Skipped {len(errors)} row(s):")
+        for error in errors[:10]:
+            print(f"   {error}")
+        if len(errors) > 10:
+            print(f"   ... and {len(errors) - 10} more")
+
+    input("\nPress Enter to continue...")
@@ -0,0 +1,259 @@
+# ============================================================================
+# indexes.py - In-memory secondary indexes over transactions
+# ============================================================================
+
+"""Secondary indexes kept in step with config.transactions."""
+
+import bisect
+import re
+from decimal import Decimal
+import config
+from utils import months_between
+
+
+TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def rebuild_indexes():
+    """Rebuild every index from config.transactions."""
+    config.user_index = {}
+    config.monthly_totals = {}
+    config.text_index = {}
+    add_transactions(config.transactions.values())
+
+
+def add_transactions(transactions):
+    """Index a batch of transactions, sorting each new user's list once."""
+    by_user = {}
+    for trans in transactions:
+        by_user.setdefault(trans["username"], []).append(trans)
+
+    for username, user_transactions in by_user.items():
+        if username in config.user_index:
+            for trans in user_transactions:
+                index_transaction(trans)
+            continue
+
+        entries = []
+        for trans in user_transactions:
+            entries.append((trans["date"], trans["transaction_id"]))
+            _add_to_totals(trans, Decimal(trans["amount"]))
+        entries.sort()
+        config.user_index[username] = {
+            "dates": [date for date, _ in entries],
+            "ids": [tid for _, tid in entries]
+        }
+
+
+def index_transaction(trans):
+    """Add a transaction to the indexes."""
+    entry = config.user_index.setdefault(trans["username"], {"dates": [], "ids": []})
+    pos = bisect.bisect_right(entry["dates"], trans["date"])
+    entry["dates"].insert(pos, trans["date"])
+    entry["ids"].insert(pos, trans["transaction_id"])
+    _add_to_totals(trans, Decimal(trans["amount"]))
+    index_text(trans)
+
+
+def unindex_transaction(trans):
+    """Remove a transaction from the indexes."""
+    entry = config.user_index.get(trans["username"])
+    if entry is None:
+        return
+    _add_to_totals(trans, -Decimal(trans["amount"]))
+    unindex_text(trans)
+
+    dates, ids = entry["dates"], entry["ids"]
+    lo = bisect.bisect_left(dates, trans["date"])
+    hi = bisect.bisect_right(dates, trans["date"])
+    for pos in range(lo, hi):
+        if ids[pos] == trans["transaction_id"]:
+            del dates[pos]
+            del ids[pos]
+            return
+
+
+def user_transaction_ids(username, start_date=None, end_date=None):
+    """Return a user's transaction ids in date order, within optional bounds."""
+    entry = config.user_index.get(username)
+    if entry is None:
+        return []
+
+    dates = entry["dates"]
+    lo = bisect.bisect_left(dates, start_date) if start_date else 0
+    hi = bisect.bisect_right(dates, end_date) if end_date else len(dates)
+    return entry["ids"][lo:hi]
+
+
+def transaction_ids_before(username, count, date=None, trans_id=None):
+    """Return the ids of up to count transactions just before a (date, id) key.
+    
+    With no id every transaction on the date counts as before it; with
+    no date the page ends at the newest transaction. Ids are in date order.
+    """
+    entry = config.user_index.get(username)
+    if entry is None or count <= 0:
+        return []
+    end = _key_position(entry, date, trans_id, False) if date else len(entry["ids"])
+    return entry["ids"][max(0, end - count):end]
+
+
+def transaction_ids_after(username, count, date, trans_id):
+    """Return the ids of up to count transactions just after a (date, id) key."""
+    entry = config.user_index.get(username)
+    if entry is None or count <= 0:
+        return []
+    start = _key_position(entry, date, trans_id, True)
+    return entry["ids"][start:start + count]
+
+
+def _key_position(entry, date, trans_id, after):
+    """Return the position of a (date, id) key, or just past it if after is set.
+    
+    A missing id stands for the end of the date when moving forwards and
+    its start when moving backwards, so a deleted row cannot cause repeats.
+    """
+    dates, ids = entry["dates"], entry["ids"]
+    lo = bisect.bisect_left(dates, date)
+    hi = bisect.bisect_right(dates, date)
+    if trans_id is None:
+        return hi
+    for pos in range(lo, hi):
+        if ids[pos] == trans_id:
+            return pos + 1 if after else pos
+    return hi if after else lo
+
+
+def drop_user(username):
+    """Remove every index entry for a user."""
+    config.user_index.pop(username, None)
+    config.text_index.pop(username, None)
+    for key in [key for key in list(config.monthly_totals) if key[0] == username]:
+        del config.monthly_totals[key]
+
+
+def month_totals(username, month):
+    """Return {(type, category): total} for a user's YYYY-MM month."""
+    return config.monthly_totals.get((username, month), {})
+
+
+def user_monthly_totals(username, start_month=None, end_month=None):
+    """Return {month: {(type, category): total}} for the months a user has data in."""
+    entry = config.user_index.get(username)
+    if entry is None or not entry["dates"]:
+        return {}
+    first = max(entry["dates"][0][:7], start_month or "")
+    last = min(entry["dates"][-1][:7], end_month or "9999-12")
+    result = {}
+    for month in months_between(first, last):
+        totals = config.monthly_totals.get((username, month))
+        if totals:
+            result[month] = dict(totals)
+    return result
+
+
+def _add_to_totals(trans, amount):
+    """Add a signed amount to the transaction's monthly aggregate."""
+    key = (trans["username"], trans["date"][:7])
+    totals = config.monthly_totals.setdefault(key, {})
+    group = (trans["type"], trans["category"])
+    total = totals.get(group, Decimal("0")) + amount
+    if total:
+        totals[group] = total
+    else:
+        totals.pop(group, None)
+
+
+def text_tokens(trans):
+    """Return the words of a transaction's description and payment method."""
+    return set(TOKEN.findall(f"{trans.get('description') or ''} "
+                             f"{trans.get('payment_method') or ''}".lower()))
+
+
+def parse_text_query(query):
+    """Split a query into (word, is_prefix) terms; a trailing * marks a prefix."""
+    terms = []
+    for word in query.lower().split():
+        tokens = TOKEN.findall(word)
+        for token in tokens[:-1]:
+            terms.append((token, False))
+        if tokens:
+            terms.append((tokens[-1], word.endswith("*")))
+    return terms
+
+
+def build_text_index(username, transactions):
+    """Build a user's word -> transaction ids index."""
+    entry = {"postings": {}, "words": None}
+    for trans in transactions:
+        _add_text(entry, trans)
+    config.text_index[username] = entry
+
+
+def index_text(trans):
+    """Add a transaction to its user's word index, if that has been built."""
+    entry = config.text_index.get(trans["username"])
+    if entry is not None:
+        _add_text(entry, trans)
+
+
+def unindex_text(trans):
+    """Remove a transaction from its user's word index, if that has been built."""
+    entry = config.text_index.get(trans["username"])
+    if entry is not None:
+        _remove_text(entry, trans)
+
+
+def text_search(username, terms):
+    """Return the set of ids matching every (word, is_prefix) term.
+    
+    Terms are intersected smallest first, so a rare word keeps the cost
+    low however common the others are.
+    """
+    entry = config.text_index[username]
+    postings = entry["postings"]
+    matches = []
+    for word, is_prefix in terms:
+        if not is_prefix:
+            matches.append(postings.get(word, set()))
+            continue
+        if entry["words"] is None:
+            entry["words"] = sorted(postings)
+        words = entry["words"]
+        lo = bisect.bisect_left(words, word)
+        hi = bisect.bisect_left(words, word + "\uffff")
+        matches.append(set().union(*(postings[w] for w in words[lo:hi])))
+    
+    if not matches:
+        return set()
+    matches.sort(key=len)
+    result = set(matches[0])
+    for ids in matches[1:]:
+        if not result:
+            break
+        result &= ids
+    return result
+
+
+def _add_text(entry, trans):
+    """Add a transaction's words to a text index entry."""
+    postings = entry["postings"]
+    for word in text_tokens(trans):
+        ids = postings.get(word)
+        if ids is None:
+            ids = postings[word] = set()
+            entry["words"] = None
+        ids.add(trans["transaction_id"])
+
+
+def _remove_text(entry, trans):
+    """Remove a transaction's words from a text index entry."""
+    postings = entry["postings"]
+    for word in text_tokens(trans):
+        ids = postings.get(word)
+        if ids is None:
+            continue
+        ids.discard(trans["transaction_id"])
+        if not ids:
+            del postings[word]
+            entry["words"] = None
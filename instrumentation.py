@@ -0,0 +1,141 @@
+# ============================================================================
+# instrumentation.py - Opt-in timing and I/O instrumentation
+# ============================================================================
+
+"""Per-action timing, row and byte counters, and optional cProfile dumps.
+
+Off by default. Enable it with PFM_INSTRUMENT=1 in the environment or
+``python main.py --instrument``; a summary table is printed to stderr on
+exit. Set PFM_PROFILE_DIR as well to write a cProfile dump for every
+action (open them with ``python -m pstats <file>``).
+
+Functions decorated with @instrumented are recorded as actions: wall
+time, CPU time, time spent waiting at input() prompts, rows scanned and
+bytes read and written while they ran. The storage code reports rows
+and bytes through add_rows/add_read/add_written, which cost a single
+flag check when instrumentation is off.
+"""
+
+import atexit
+import builtins
+import cProfile
+import functools
+import os
+import sys
+import time
+import config
+import report_cache
+
+
+_counters = {"rows": 0, "read": 0, "written": 0, "wait": 0.0}
+_actions = {}
+_depth = 0
+_profiled = 0
+
+
+def add_rows(count):
+    """Record rows scanned."""
+    if config.INSTRUMENT:
+        _counters["rows"] += count
+
+
+def add_read(nbytes):
+    """Record bytes read from disk."""
+    if config.INSTRUMENT:
+        _counters["read"] += nbytes
+
+
+def add_written(nbytes):
+    """Record bytes written to disk."""
+    if config.INSTRUMENT:
+        _counters["written"] += nbytes
+
+
+_input = builtins.input
+
+
+def _timed_input(prompt=""):
+    """input() that books the time spent waiting for the user."""
+    start = time.perf_counter()
+    try:
+        return _input(prompt)
+    finally:
+        _counters["wait"] += time.perf_counter() - start
+
+
+def enable():
+    """Turn instrumentation on and print the summary at exit."""
+    if builtins.input is not _timed_input:
+        config.INSTRUMENT = True
+        builtins.input = _timed_input
+        atexit.register(print_summary)
+
+
+def instrumented(func):
+    """Record every call of func as an action named after it."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not config.INSTRUMENT:
+            return func(*args, **kwargs)
+        return _run_action(func.__name__, func, args, kwargs)
+    return wrapper
+
+
+def _run_action(name, func, args, kwargs):
+    """Run func, adding its cost to the action's totals."""
+    global _depth, _profiled
+    before = dict(_counters)
+    profiler = None
+    if config.PROFILE_DIR and _depth == 0:
+        profiler = cProfile.Profile()
+    wall, cpu = time.perf_counter(), time.process_time()
+    _depth += 1
+    try:
+        if profiler:
+            return profiler.runcall(func, *args, **kwargs)
+        return func(*args, **kwargs)
+    finally:
+        _depth -= 1
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+        stats = _actions.setdefault(name, {"calls": 0, "wall": 0.0, "max_wall": 0.0,
+                                           "cpu": 0.0, "wait": 0.0, "rows": 0,
+                                           "read": 0, "written": 0})
+        stats["calls"] += 1
+        stats["wall"] += wall
+        stats["max_wall"] = max(stats["max_wall"], wall)
+        stats["cpu"] += cpu
+        for key in ("wait", "rows", "read", "written"):
+            stats[key] += _counters[key] - before[key]
+        if profiler:
+            _profiled += 1
+            os.makedirs(config.PROFILE_DIR, exist_ok=True)
+            profiler.dump_stats(os.path.join(config.PROFILE_DIR, f"{_profiled:04d}-{name}.prof"))
+
+
+def summary():
+    """Return {action: totals} recorded so far."""
+    return {name: dict(stats) for name, stats in _actions.items()}
+
+
+def print_summary(file=None):
+    """Print the per-action totals, slowest (excluding input waits) first."""
+    file = file or sys.stderr
+    if not _actions:
+        return
+    print("\nInstrumentation summary (busy = wall time minus input waits)", file=file)
+    print(f"{'Action':<22} {'Calls':>6} {'Busy ms':>10} {'Max wall':>10} {'CPU ms':>10} "
+          f"{'Rows':>10} {'Read KB':>10} {'Written KB':>11}", file=file)
+    print("=" * 96, file=file)
+    ordered = sorted(_actions.items(), key=lambda item: item[1]["wait"] - item[1]["wall"])
+    for name, stats in ordered:
+        print(f"{name:<22} {stats['calls']:>6} {(stats['wall'] - stats['wait']) * 1000:>10.1f} "
+              f"{stats['max_wall'] * 1000:>10.1f} {stats['cpu'] * 1000:>10.1f} "
+              f"{stats['rows']:>10,} {stats['read'] / 1024:>10,.1f} "
+              f"{stats['written'] / 1024:>11,.1f}", file=file)
+    cache = report_cache.stats()
+    if cache["hits"] or cache["misses"]:
+        print(f"Report cache: {cache['hits']} hits, {cache['misses']} misses "
+              f"({cache['hit_rate']:.0%}), {cache['evictions']} evictions, "
+              f"{cache['invalidations']} invalidations", file=file)
+    if config.PROFILE_DIR:
+        print(f"cProfile dumps written to {config.PROFILE_DIR}", file=file)
@@ -0,0 +1,194 @@
+# ============================================================================
+# loadtest.py - Load-test harness for the HTTP server
+# ============================================================================
+
+"""Drive server.py with many concurrent keep-alive clients.
+
+Each client registers its own user (optionally logging in for a
+session token with --tokens) and then sends a mix of writes
+(new transactions) and reads (dashboard, transaction list, budgets).
+Latencies are reported as percentiles together with overall throughput.
+
+    python loadtest.py --spawn --clients 50 --requests 200
+    python loadtest.py --port 8080          # against a running server
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def percentile(sorted_values, pct):
+    """Return the pct-th percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class Client:
+    """A keep-alive HTTP/1.1 connection speaking JSON."""
+
+    def __init__(self, host, port, username=None, password=None):
+        self.host, self.port = host, port
+        self.auth = None
+        if username:
+            token = base64.b64encode(f"{username}:{password}".encode()).decode()
+            self.auth = f"Basic {token}"
+        self.reader = self.writer = None
+
+    async def connect(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+    async def request(self, method, path, body=None):
+        """Send a request and return (status, decoded JSON or None)."""
+        data = json.dumps(body).encode() if body is not None else b""
+        head = f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\nContent-Length: {len(data)}\r\n"
+        if data:
+            head += "Content-Type: application/json\r\n"
+        if self.auth:
+            head += f"Authorization: {self.auth}\r\n"
+        self.writer.write((head + "\r\n").encode("latin-1") + data)
+        await self.writer.drain()
+
+        status = int((await self.reader.readline()).split()[1])
+        length = 0
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            if name.lower() == "content-length":
+                length = int(value)
+        payload = await self.reader.readexactly(length) if length else b""
+        return status, json.loads(payload) if payload else None
+
+    async def close(self):
+        if self.writer:
+            self.writer.close()
+            await self.writer.wait_closed()
+
+
+async def setup_client(client, number, args):
+    """Register the client's user (and log in with --tokens); returns success.
+
+    Registration and login run the password KDF, so they are kept out of
+    the timed part of the run.
+    """
+    username, password = f"load{number}_{args.tag}", "secret"
+    await client.connect()
+    status, _ = await client.request("POST", "/users", {
+        "username": username, "name": f"Load {number}", "password": password})
+    if status == 201 and args.tokens:
+        status, payload = await client.request("POST", "/sessions", {
+            "username": username, "password": password})
+        if status == 201:
+            client.auth = f"Bearer {payload['token']}"
+    if status == 201:
+        status, _ = await client.request("PUT", "/budgets/Food", {"amount": "500"})
+    return status < 400
+
+
+async def run_client(number, args, latencies, failures, ready, go):
+    """Set up a client, wait for all the others, then send args.requests mixed requests."""
+    client = Client(args.host, args.port, f"load{number}_{args.tag}", "secret")
+    try:
+        try:
+            ok = await setup_client(client, number, args)
+        finally:
+            ready.append(number)
+            if len(ready) == args.clients:
+                go.set()
+        await go.wait()
+        if not ok:
+            failures.append(number)
+            return
+
+        rng = random.Random(number)
+        for _ in range(args.requests):
+            if rng.random() < args.write_ratio:
+                request = ("POST", "/transactions", {
+                    "type": "expense", "amount": f"{rng.uniform(1, 100):.2f}",
+                    "category": rng.choice(["Food", "Rent", "Shopping"]),
+                    "date": f"2026-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"})
+            else:
+                request = rng.choice([("GET", "/dashboard", None),
+                                      ("GET", "/transactions", None),
+                                      ("GET", "/budgets", None)])
+            start = time.perf_counter()
+            status, _ = await client.request(*request)
+            latencies.append(time.perf_counter() - start)
+            if status >= 400:
+                failures.append(status)
+    finally:
+        await client.close()
+
+
+async def wait_for_server(host, port, timeout=10):
+    """Wait until the server accepts connections."""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.open_connection(host, port)
+            writer.close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.1)
+
+
+async def main(args):
+    server = workdir = None
+    if args.spawn:
+        here = os.path.dirname(os.path.abspath(__file__))
+        workdir = tempfile.mkdtemp(prefix="pfm-load-")
+        server = subprocess.Popen([sys.executable, os.path.join(here, "server.py"), str(args.port)],
+                                  cwd=workdir, stdout=subprocess.DEVNULL)
+    try:
+        await wait_for_server(args.host, args.port)
+        latencies, failures, ready, go = [], [], [], asyncio.Event()
+        clients = asyncio.gather(*(run_client(i, args, latencies, failures, ready, go)
+                                   for i in range(args.clients)))
+        await go.wait()
+        start = time.perf_counter()
+        await clients
+        elapsed = time.perf_counter() - start
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+        if workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    latencies.sort()
+    print(f"Clients:     {args.clients}")
+    print(f"Requests:    {len(latencies)} in {elapsed:.2f}s ({len(latencies) / elapsed:,.0f} req/s)")
+    print(f"Failures:    {len(failures)}")
+    for pct in (50, 90, 95, 99):
+        print(f"p{pct:<10} {percentile(latencies, pct) * 1000:8.2f} ms")
+    print(f"max         {(latencies[-1] if latencies else 0) * 1000:8.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load-test the finance HTTP server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--clients", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=100, help="requests per client")
+    parser.add_argument("--write-ratio", type=float, default=0.3)
+    parser.add_argument("--tokens", action="store_true",
+                        help="log in once and send a session token instead of Basic credentials")
+    parser.add_argument("--spawn", action="store_true",
+                        help="start a server in a temporary directory for the run")
+    parser.add_argument("--tag", default=str(int(time.time())),
+                        help="suffix making this run's usernames unique")
+    asyncio.run(main(parser.parse_args()))
@@ -11,21 +11,24 @@ import sys
 from auth import register_user, login_user
 from transactions import (add_transaction, view_transactions, 
                         edit_transaction, delete_transaction, search_transactions)
-from reports import view_dashboard
+from reports import view_dashboard, view_history
 from budget import set_budget, view_budget_status
 from savings import add_savings_goal, view_savings_goals
-from data_manager import load_data, save_data, export_to_csv
+from data_manager import load_data, save_data, export_to_csv, migrate_format
+from importer import import_transactions
 from utils import clear_screen, print_header
 import config
+import instrumentation
+import services
 
 
-def main_menu():
-    """Display and handle main menu."""
+def main_menu(session):
+    """Display and handle main menu for a logged-in session."""
     while True:
         clear_screen()
         print_header("MAIN MENU")
         
-        print(f"Logged in as: {config.users[config.current_user]['name']}\n")
+        print(f"Logged in as: {session.name}\n")
         
         print("1.  Dashboard")
         print("2.  Add Transaction")
@@ -38,36 +41,43 @@ def main_menu():
         print("9.  Add Savings Goal")
         print("10. View Savings Goals")
         print("11. Export to CSV")
-        print("12. Logout")
-        print("13. Exit")
+        print("12. Import Transactions")
+        print("13. Monthly History")
+        print("14. Logout")
+        print("15. Exit")
         
         choice = input("\nSelect option: ").strip()
         
         if choice == "1":
-            view_dashboard()
+            view_dashboard(session)
         elif choice == "2":
-            add_transaction()
+            add_transaction(session)
         elif choice == "3":
-            view_transactions()
+            view_transactions(session)
         elif choice == "4":
-            edit_transaction()
+            edit_transaction(session)
         elif choice == "5":
-            delete_transaction()
+            delete_transaction(session)
         elif choice == "6":
-            search_transactions()
+            search_transactions(session)
         elif choice == "7":
-            set_budget()
+            set_budget(session)
         elif choice == "8":
-            view_budget_status()
+            view_budget_status(session)
         elif choice == "9":
-            add_savings_goal()
+            add_savings_goal(session)
         elif choice == "10":
-            view_savings_goals()
+            view_savings_goals(session)
         elif choice == "11":
-            export_to_csv()
+            export_to_csv(session)
         elif choice == "12":
-            return
+            import_transactions(session)
         elif choice == "13":
+            view_history(session)
+        elif choice == "14":
+            services.logout(session)
+            return
+        elif choice == "15":
             print("\nThank you for using Personal Finance Manager!")
             exit(0)
         else:
@@ -77,7 +87,11 @@ def main_menu():
 
 def main():
     """Main program entry point."""
-    load_data()
+    try:
+        load_data()
+    except Exception as e:
+        print(f"❌ Error loading data: {e}")
+        sys.exit(1)
     
     while True:
         clear_screen()
@@ -90,8 +104,9 @@ def main():
         choice = input("\nSelect option: ").strip()
         
         if choice == "1":
-            if login_user():
-                main_menu()
+            session = login_user()
+            if session:
+                main_menu(session)
         elif choice == "2":
             register_user()
         elif choice == "3":
@@ -103,5 +118,16 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    if "--instrument" in sys.argv:
+        sys.argv.remove("--instrument")
+        config.INSTRUMENT = True
+    if config.INSTRUMENT:
+        instrumentation.enable()
+    
+    if len(sys.argv) == 3 and sys.argv[1] == "--migrate-format":
+        if migrate_format(sys.argv[2]):
+            print(f"Data files rewritten in '{sys.argv[2]}' format.")
+            print(f"Set DATA_FORMAT = \"{sys.argv[2]}\" in config.py to keep using it.")
+    else:
+        main()
 
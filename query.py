@@ -0,0 +1,176 @@
+# ============================================================================
+# query.py - Composable multi-predicate transaction queries
+# ============================================================================
+
+"""Combine any of the search filters in a single pass over a user's rows.
+
+run() accepts every filter at once: a date range, a set of categories,
+the type, an amount range, the payment method, and words of the
+description. It starts from the narrowest source of candidate rows it
+can find:
+
+    sqlite    every filter pushed into one SQL query (SQLite backend)
+    dates     the date index slice for the date range
+    text      the ids matched in the user's word index
+
+The remaining filters are checked on each candidate, cheapest first, so
+amounts are only parsed for rows that passed everything else. Results
+are yielded lazily in the requested order with offset/limit applied as
+they stream; date order needs no sorting at all. Rows are always the
+full stored transactions; the record file only serves aggregate reports.
+"""
+
+import heapq
+import itertools
+from decimal import Decimal
+import config
+import data_manager
+import indexes
+import sqlite_store
+from instrumentation import add_rows
+
+
+SORT_KEYS = {
+    "date": lambda t: (t["date"], t["transaction_id"]),
+    "amount": lambda t: (Decimal(t["amount"]), t["date"], t["transaction_id"]),
+    "category": lambda t: (t["category"].lower(), t["date"], t["transaction_id"])
+}
+
+# Text matches up to this many ids are pushed into the SQL query
+SQLITE_MAX_IDS = 500
+
+
+def run(username, start_date=None, end_date=None, categories=None, trans_type=None,
+        min_amount=None, max_amount=None, payment_method=None, text=None,
+        sort="date", descending=False, offset=0, limit=None):
+    """Yield a user's transactions matching every given filter.
+
+    categories is one category or a collection of them; categories and
+    payment_method match case-insensitively. Amounts are Decimals and
+    dates inclusive YYYY-MM-DD bounds. text matches words of the
+    description or payment method, a trailing * marking a prefix.
+    Results are ordered by sort ("date", "amount" or "category", ties
+    broken by date) and the offset/limit page is applied as they stream.
+    """
+    if sort not in SORT_KEYS:
+        raise ValueError(f"Cannot sort by {sort}!")
+    if isinstance(categories, str):
+        categories = [categories]
+    filters = {
+        "start_date": start_date or None,
+        "end_date": end_date or None,
+        "categories": {c.lower() for c in categories} if categories else None,
+        "trans_type": trans_type or None,
+        "min_amount": min_amount,
+        "max_amount": max_amount,
+        "payment_method": payment_method.lower() if payment_method else None,
+        "terms": indexes.parse_text_query(text) if text is not None else None
+    }
+    if filters["terms"] == []:
+        return
+
+    newest_first = sort == "date" and descending
+    if config.STORAGE_BACKEND == "sqlite":
+        data_manager.ensure_loaded("transactions", username)
+        rows, paged = _sqlite_rows(username, filters, sort, descending, offset, limit)
+        yield from rows if paged else _page(rows, "date", descending, offset, limit)
+        return
+    data_manager.ensure_loaded("transactions", username)
+    rows = _index_rows(username, filters, newest_first)
+    yield from _page(rows, sort, descending, offset, limit)
+
+
+def _page(rows, sort, descending, offset, limit):
+    """Order rows and apply offset/limit; rows already in date order stream through."""
+    stop = offset + limit if limit is not None else None
+    if sort != "date":
+        key = SORT_KEYS[sort]
+        if stop is not None:
+            # Only the first offset + limit rows are ever kept
+            rows = (heapq.nlargest if descending else heapq.nsmallest)(stop, rows, key=key)
+        else:
+            rows = sorted(rows, key=key, reverse=descending)
+    return itertools.islice(rows, offset, stop)
+
+
+def _text_ids(username, terms):
+    """Return the ids matching text terms, building the word index on first use.
+    
+    The index follows this process's own writes; rows written by other
+    processes are picked up because data_manager.refresh() drops it.
+    """
+    if username not in config.text_index:
+        indexes.build_text_index(username, data_manager.iter_user_transactions(username))
+    return indexes.text_search(username, terms)
+
+
+def _index_rows(username, filters, newest_first):
+    """Yield matching in-memory transactions, starting from the smallest candidate set."""
+    ids = indexes.user_transaction_ids(username, filters["start_date"], filters["end_date"])
+    text_ids = None
+    if filters["terms"] is not None:
+        text_ids = _text_ids(username, filters["terms"])
+        if len(text_ids) < len(ids):
+            ids = sorted(text_ids, key=lambda tid: (config.transactions[tid]["date"], tid))
+
+    add_rows(len(ids))
+    if newest_first:
+        ids = reversed(ids)
+    matches = _predicate(filters, text_ids)
+    for tid in ids:
+        trans = config.transactions[tid]
+        if matches(trans):
+            yield trans
+
+
+def _predicate(filters, text_ids=None):
+    """Return a function checking a transaction against every filter.
+
+    String comparisons come first; the amount is parsed last, only for
+    rows that passed everything else.
+    """
+    trans_type = filters["trans_type"]
+    categories = filters["categories"]
+    method = filters["payment_method"]
+    start, end = filters["start_date"], filters["end_date"]
+    low, high = filters["min_amount"], filters["max_amount"]
+
+    def matches(t):
+        if trans_type and t["type"] != trans_type:
+            return False
+        if categories is not None and t["category"].lower() not in categories:
+            return False
+        if method is not None and (t.get("payment_method") or "").lower() != method:
+            return False
+        if (start and t["date"] < start) or (end and t["date"] > end):
+            return False
+        if text_ids is not None and t["transaction_id"] not in text_ids:
+            return False
+        if low is not None or high is not None:
+            amount = Decimal(t["amount"])
+            if (low is not None and amount < low) or (high is not None and amount > high):
+                return False
+        return True
+    return matches
+
+
+def _sqlite_rows(username, filters, sort, descending, offset, limit):
+    """Run the query in SQLite; returns (rows in order, whether the page is applied).
+
+    A text filter is pushed into SQL as a list of matched ids when there
+    are few enough of them; otherwise the rows are checked against the
+    ids here and the caller applies offset/limit.
+    """
+    text_ids = None
+    if filters["terms"] is not None:
+        text_ids = _text_ids(username, filters["terms"])
+        if not text_ids:
+            return iter(()), True
+    args = (username, filters["start_date"], filters["end_date"], filters["categories"],
+            filters["trans_type"], filters["min_amount"], filters["max_amount"],
+            filters["payment_method"])
+    if text_ids is None or len(text_ids) <= SQLITE_MAX_IDS:
+        return sqlite_store.select_transactions(*args, text_ids, sort, descending,
+                                                offset, limit), True
+    rows = sqlite_store.select_transactions(*args, None, sort, descending)
+    return (t for t in rows if t["transaction_id"] in text_ids), False
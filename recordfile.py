@@ -0,0 +1,189 @@
+# ============================================================================
+# recordfile.py - Fixed-width, memory-mapped transaction record file
+# ============================================================================
+
+"""Read-only fixed-width transaction file for reports.
+
+The file holds every transaction as a packed record sorted by user and
+date, with a small header listing categories and where each user's rows
+start. Readers mmap it and unpack only the rows they need, so reporting
+does not have to load transactions.json or build per-row dicts.
+
+Layout (little-endian):
+    header      magic, user count, category count, record count
+    categories  32-byte names
+    users       64-byte username, first row, row count
+    records     RECORD (id, amount in cents, day ordinal, category, type)
+"""
+
+import datetime
+import mmap
+import os
+import struct
+from decimal import Decimal, ROUND_HALF_EVEN
+from instrumentation import add_rows, add_read, add_written
+from utils import month_end
+
+
+TYPES = ["income", "expense"]
+CENT = Decimal("0.01")
+
+MAGIC = b"PFMREC1\0"
+HEADER = struct.Struct("<8sIIQ")
+CATEGORY = struct.Struct("<32s")
+USER = struct.Struct("<64sQQ")
+RECORD = struct.Struct("<16sqiHB")
+
+
+def to_cents(amount):
+    """Convert a Decimal (or amount string) to integer minor units."""
+    return int((Decimal(amount) / CENT).quantize(Decimal("1"), rounding=ROUND_HALF_EVEN))
+
+
+def from_cents(cents):
+    """Convert integer minor units back to a Decimal."""
+    return Decimal(int(cents)) * CENT
+
+
+def day_ordinal(date_str):
+    """Convert a YYYY-MM-DD string to a day ordinal."""
+    return datetime.date.fromisoformat(date_str).toordinal()
+
+
+def write(path, users):
+    """Write a record file from (username, transactions in date order) pairs."""
+    categories = {}
+    user_rows = []
+    records = bytearray()
+    row = 0
+    for username, transactions in users:
+        first = row
+        for trans in transactions:
+            if len(trans["transaction_id"].encode()) > 16:
+                raise ValueError("Transaction ids longer than 16 bytes cannot be stored")
+            code = categories.setdefault(trans["category"], len(categories))
+            records += RECORD.pack(trans["transaction_id"].encode(),
+                                   to_cents(trans["amount"]),
+                                   day_ordinal(trans["date"]),
+                                   code, TYPES.index(trans["type"]))
+            row += 1
+        user_rows.append((username, first, row - first))
+
+    if any(len(name.encode()) > 32 for name in categories):
+        raise ValueError("Category names longer than 32 bytes cannot be stored")
+    if any(len(username.encode()) > 64 for username, _, _ in user_rows):
+        raise ValueError("Usernames longer than 64 bytes cannot be stored")
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, len(user_rows), len(categories), row))
+        for name in categories:
+            f.write(CATEGORY.pack(name.encode()))
+        for username, first, count in user_rows:
+            f.write(USER.pack(username.encode(), first, count))
+        f.write(records)
+        f.flush()
+        os.fsync(f.fileno())
+        add_written(f.tell())
+    os.replace(tmp_path, path)
+
+
+def _open(path):
+    """Map a record file and parse its header."""
+    with open(path, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, user_count, category_count, _ = HEADER.unpack_from(mm, 0)
+    if magic != MAGIC:
+        mm.close()
+        raise ValueError(f"{path} is not a transaction record file")
+
+    offset = HEADER.size
+    categories = []
+    for _ in range(category_count):
+        categories.append(CATEGORY.unpack_from(mm, offset)[0].rstrip(b"\0").decode())
+        offset += CATEGORY.size
+    users = {}
+    for _ in range(user_count):
+        name, first, count = USER.unpack_from(mm, offset)
+        users[name.rstrip(b"\0").decode()] = (first, count)
+        offset += USER.size
+    return mm, categories, users, offset
+
+
+def _bisect_day(mm, base, lo, hi, day, right):
+    """Binary search a user's rows (sorted by day) for a day ordinal."""
+    day_offset = base + 24
+    while lo < hi:
+        mid = (lo + hi) // 2
+        value = struct.unpack_from("<i", mm, day_offset + mid * RECORD.size)[0]
+        if value < day or (right and value == day):
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+def _user_rows(mm, users, base, username, start_date=None, end_date=None):
+    """Return the [lo, hi) row range of a user's rows in a date range."""
+    if username not in users:
+        return 0, 0
+    first, count = users[username]
+    lo, hi = first, first + count
+    if start_date:
+        lo = _bisect_day(mm, base, lo, hi, day_ordinal(start_date), False)
+    if end_date:
+        hi = _bisect_day(mm, base, lo, hi, day_ordinal(end_date), True)
+    add_rows(hi - lo)
+    add_read((hi - lo) * RECORD.size)
+    return lo, hi
+
+
+def scan(path, username, start_date=None, end_date=None):
+    """Yield (id, cents, day, category, type) for a user's rows in a date range."""
+    mm, categories, users, base = _open(path)
+    try:
+        lo, hi = _user_rows(mm, users, base, username, start_date, end_date)
+        for offset in range(base + lo * RECORD.size, base + hi * RECORD.size, RECORD.size):
+            tid, cents, day, cat_code, type_code = RECORD.unpack_from(mm, offset)
+            yield (tid.rstrip(b"\0").decode(), cents, day,
+                   categories[cat_code], TYPES[type_code])
+    finally:
+        mm.close()
+
+
+def month_totals(path, username, month):
+    """Return {(type, category): Decimal total} for a user's YYYY-MM month."""
+    cents_by_group = {}
+    for _, cents, _, category, trans_type in scan(path, username,
+                                                  f"{month}-01", month_end(month)):
+        group = (trans_type, category)
+        cents_by_group[group] = cents_by_group.get(group, 0) + cents
+    return {group: from_cents(cents) for group, cents in cents_by_group.items() if cents}
+
+
+def monthly_totals(path, username, start_month=None, end_month=None):
+    """Return {month: {(type, category): Decimal total}} in one pass over a user's rows."""
+    mm, categories, users, base = _open(path)
+    try:
+        lo, hi = _user_rows(mm, users, base, username, start_month and f"{start_month}-01",
+                            end_month and month_end(end_month))
+        cents_by_day = {}
+        with memoryview(mm)[base + lo * RECORD.size:base + hi * RECORD.size] as rows:
+            for _, cents, day, cat_code, type_code in RECORD.iter_unpack(rows):
+                key = (day, type_code, cat_code)
+                cents_by_day[key] = cents_by_day.get(key, 0) + cents
+    finally:
+        mm.close()
+
+    months = {}
+    month_of = {}
+    for (day, type_code, cat_code), cents in cents_by_day.items():
+        month = month_of.get(day)
+        if month is None:
+            month = month_of[day] = datetime.date.fromordinal(day).strftime("%Y-%m")
+        groups = months.setdefault(month, {})
+        group = (TYPES[type_code], categories[cat_code])
+        groups[group] = groups.get(group, 0) + cents
+    return {month: {group: from_cents(cents) for group, cents in groups.items() if cents}
+            for month, groups in months.items()}
+
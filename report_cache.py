@@ -0,0 +1,103 @@
+# ============================================================================
+# report_cache.py - LRU cache of computed reports
+# ============================================================================
+
+"""Bounded LRU cache for dashboard, budget and history reports.
+
+Entries are keyed by (username, report, period) and remember the span of
+months whose transactions they were computed from. A dashboard depends
+on its month and, through the balance, every month before it; budget
+status on its month alone; a history on every month up to its end. A
+transaction change therefore drops only its user's entries covering the
+changed month, and a budget change only that user's budget reports.
+Changes saved by other processes are caught by data_manager.refresh(),
+which the report services call before each lookup and which clears the
+owner's entries.
+
+At most config.REPORT_CACHE_SIZE entries are kept (0 disables caching),
+the least recently used going first. stats() returns the hit, miss,
+eviction and invalidation counters for monitoring.
+"""
+
+import collections
+import threading
+import config
+
+
+_lock = threading.Lock()               # guards the structures below, not compute()
+_entries = collections.OrderedDict()   # (username, report, period) -> (first, last, value)
+_user_keys = {}                         # username -> keys of that user's entries
+_stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+
+def get(username, report, period, months, compute):
+    """Return a cached report, calling compute() to build it on a miss.
+
+    months is the (first, last) span of months the report depends on,
+    None marking an open end. Cached values are shared between callers
+    and must not be modified.
+    """
+    key = (username, report, period)
+    with _lock:
+        entry = _entries.get(key)
+        if entry is not None:
+            _entries.move_to_end(key)
+            _stats["hits"] += 1
+            return entry[2]
+        _stats["misses"] += 1
+
+    value = compute()
+    if config.REPORT_CACHE_SIZE > 0:
+        with _lock:
+            _entries[key] = (months[0], months[1], value)
+            _user_keys.setdefault(username, set()).add(key)
+            while len(_entries) > config.REPORT_CACHE_SIZE:
+                _drop(next(iter(_entries)))
+                _stats["evictions"] += 1
+    return value
+
+
+def invalidate_months(username, months):
+    """Drop a user's reports that depend on any of the given YYYY-MM months."""
+    with _lock:
+        for key in list(_user_keys.get(username, ())):
+            first, last, _ = _entries[key]
+            if any((first is None or first <= month) and (last is None or month <= last)
+                   for month in months):
+                _drop(key)
+                _stats["invalidations"] += 1
+
+
+def invalidate_report(username, report):
+    """Drop every cached report of one kind for a user."""
+    with _lock:
+        for key in list(_user_keys.get(username, ())):
+            if key[1] == report:
+                _drop(key)
+                _stats["invalidations"] += 1
+
+
+def clear(username=None):
+    """Drop a user's entries, or every entry when username is None."""
+    with _lock:
+        keys = list(_entries) if username is None else list(_user_keys.get(username, ()))
+        for key in keys:
+            _drop(key)
+        _stats["invalidations"] += len(keys)
+
+
+def stats():
+    """Return the cache counters, its size and the hit rate."""
+    with _lock:
+        lookups = _stats["hits"] + _stats["misses"]
+        return dict(_stats, size=len(_entries), capacity=config.REPORT_CACHE_SIZE,
+                    hit_rate=_stats["hits"] / lookups if lookups else 0.0)
+
+
+def _drop(key):
+    """Remove one entry (lock held)."""
+    del _entries[key]
+    keys = _user_keys[key[0]]
+    keys.discard(key)
+    if not keys:
+        del _user_keys[key[0]]
@@ -6,80 +6,28 @@
 """Financial reporting and dashboard functionality."""
 
 import datetime
-from decimal import Decimal
-import config
-from utils import clear_screen, print_header, print_box
+from instrumentation import instrumented
+from utils import clear_screen, print_header, print_box, validate_month
+from services import calculate_health_score, get_dashboard, get_history
 
 
-def calculate_health_score(income, expenses, savings):
-    """Calculate financial health score (0-100)."""
-    if income == 0:
-        return 0
-    
-    savings_rate = (savings / income) * 100 if income > 0 else 0
-    expense_ratio = (expenses / income) * 100 if income > 0 else 100
-    
-    # Score based on savings rate and expense ratio
-    score = 0
-    
-    if savings_rate >= 30:
-        score += 50
-    elif savings_rate >= 20:
-        score += 40
-    elif savings_rate >= 10:
-        score += 30
-    elif savings_rate >= 0:
-        score += 20
-    else:
-        score += 0
-    
-    if expense_ratio <= 50:
-        score += 50
-    elif expense_ratio <= 70:
-        score += 40
-    elif expense_ratio <= 90:
-        score += 30
-    elif expense_ratio <= 100:
-        score += 20
-    else:
-        score += 10
-    
-    return min(100, score)
-
-
-def view_dashboard():
+@instrumented
+def view_dashboard(session):
     """Display financial dashboard."""
     clear_screen()
     print_header("PERSONAL FINANCE MANAGER v1.0")
     
-    user_transactions = {tid: t for tid, t in config.transactions.items() 
-                        if t["username"] == config.current_user}
-    
-    # Calculate totals
-    total_income = Decimal("0")
-    total_expenses = Decimal("0")
-    category_totals = {}
+    dashboard = get_dashboard(session.username)
+    total_income = dashboard["income"]
+    total_expenses = dashboard["expenses"]
+    net_savings = dashboard["net_savings"]
+    current_balance = dashboard["balance"]
     
-    current_month = datetime.date.today().strftime("%Y-%m")
-    
-    for tid, trans in user_transactions.items():
-        amount = Decimal(trans["amount"])
-        if trans["date"].startswith(current_month):
-            if trans["type"] == "income":
-                total_income += amount
-            else:
-                total_expenses += amount
-                category = trans["category"]
-                category_totals[category] = category_totals.get(category, Decimal("0")) + amount
-    
-    net_savings = total_income - total_expenses
-    current_balance = net_savings + Decimal("10000")  # Example starting balance
-    
-    currency = config.users[config.current_user]["currency"]
+    currency = session.currency
     
     # Display dashboard
     print_box([
-        f"User: {config.users[config.current_user]['name']}",
+        f"User: {session.name}",
         f"Period: {datetime.date.today().strftime('%B %Y')}"
     ], 70)
     
@@ -94,14 +42,11 @@ def view_dashboard():
     
     # Top spending categories
     print("\nTop Spending Categories:")
-    sorted_categories = sorted(category_totals.items(), key=lambda x: x[1], reverse=True)[:3]
-    
-    for i, (cat, amount) in enumerate(sorted_categories, 1):
-        percentage = (amount / total_expenses * 100) if total_expenses > 0 else 0
-        print(f"{i}. {cat:<20} {currency}{amount:>10,.2f}  ({percentage:5.1f}%)")
+    for i, top in enumerate(dashboard["top_categories"], 1):
+        print(f"{i}. {top['category']:<20} {currency}{top['amount']:>10,.2f}  ({top['percentage']:5.1f}%)")
     
     # Financial Health Score
-    health_score = calculate_health_score(total_income, total_expenses, net_savings)
+    health_score = dashboard["health_score"]
     print(f"\n💰 Financial Health Score: {health_score}/100")
     
     if health_score >= 80:
@@ -115,3 +60,60 @@ def view_dashboard():
     
     input("\nPress Enter to continue...")
 
+
+@instrumented
+def view_history(session):
+    """Display month-by-month income, expenses and balance."""
+    clear_screen()
+    print_header("MONTHLY HISTORY")
+    
+    today = datetime.date.today()
+    default_start = f"{today.year - 1}-{today.month:02d}"
+    start_month = input(f"Start month (YYYY-MM) [{default_start}]: ").strip() or default_start
+    end_month = input(f"End month (YYYY-MM) [{today.strftime('%Y-%m')}]: ").strip() or None
+    if not validate_month(start_month) or (end_month and not validate_month(end_month)):
+        print("❌ Invalid month format!")
+        input("\nPress Enter to continue...")
+        return
+    
+    try:
+        history = get_history(session.username, start_month, end_month)
+    except ValueError as e:
+        print(f"❌ {e}")
+        input("\nPress Enter to continue...")
+        return
+    months = history["months"]
+    currency = session.currency
+    
+    clear_screen()
+    print_header(f"MONTHLY HISTORY {history['start_month']} TO {history['end_month']}")
+    print(f"Opening balance: {currency}{history['opening_balance']:,.2f}\n")
+    print("=" * 100)
+    print(f"{'Month':<8} | {'Income':>11} | {'Expenses':>11} | {'Net':>11} | {'Balance':>12} | "
+          f"{'3-mo avg exp':>12} | {'12-mo avg exp':>13} | {'YoY exp':>7}")
+    print("=" * 100)
+    for row in months:
+        year_ago = row["year_ago"]
+        change = year_ago["expenses_change"] if year_ago else None
+        yoy = f"{change:+6.1f}%" if change is not None else "-"
+        print(f"{row['month']:<8} | {row['income']:>11,.2f} | {row['expenses']:>11,.2f} | "
+              f"{row['net']:>11,.2f} | {row['balance']:>12,.2f} | "
+              f"{row['rolling'][3]['expenses']:>12,.2f} | "
+              f"{row['rolling'][12]['expenses']:>13,.2f} | {yoy:>7}")
+    print("=" * 100)
+    print(f"Closing balance: {currency}{history['closing_balance']:,.2f}")
+    
+    # Spending by category for the biggest categories of the period
+    totals = {}
+    for row in months:
+        for category, amount in row["expenses_by_category"].items():
+            totals[category] = totals.get(category, 0) + amount
+    top = sorted(totals, key=totals.get, reverse=True)[:5]
+    if top:
+        print("\nSpending by category:")
+        print(f"{'Month':<8} | " + " | ".join(f"{category[:14]:>14}" for category in top))
+        for row in months:
+            print(f"{row['month']:<8} | " + " | ".join(
+                f"{row['expenses_by_category'].get(category, 0):>14,.2f}" for category in top))
+    
+    input("\nPress Enter to continue...")
@@ -5,14 +5,13 @@
 
 """Savings goals management functionality."""
 
-import datetime
-from decimal import Decimal
-import config
+import services
+from instrumentation import instrumented
 from utils import clear_screen, print_header, validate_amount, validate_date
-from data_manager import save_data
 
 
-def add_savings_goal():
+@instrumented
+def add_savings_goal(session):
     """Add a savings goal."""
     clear_screen()
     print_header("ADD SAVINGS GOAL")
@@ -24,9 +23,7 @@ def add_savings_goal():
         return
     
     target_str = input("Target amount: ").strip()
-    target = validate_amount(target_str)
-    
-    if not target:
+    if not validate_amount(target_str):
         print("❌ Invalid amount!")
         input("\nPress Enter to continue...")
         return
@@ -37,51 +34,34 @@ def add_savings_goal():
         input("\nPress Enter to continue...")
         return
     
-    current_str = input("Current savings (0 if starting new): ").strip() or "0"
-    current = validate_amount(current_str)
-    if current is None:
-        current = Decimal("0")
-    
-    goal_id = "GOAL" + str(len(config.savings_goals) + 1).zfill(3)
-    
-    if config.current_user not in config.savings_goals:
-        config.savings_goals[config.current_user] = {}
-    
-    config.savings_goals[config.current_user][goal_id] = {
-        "goal_id": goal_id,
-        "name": goal_name,
-        "target": str(target),
-        "current": str(current),
-        "deadline": deadline,
-        "created_date": str(datetime.date.today())
-    }
+    current_str = input("Current savings (0 if starting new): ").strip()
     
-    save_data()
+    services.add_savings_goal(session.username, goal_name, target_str, deadline, current_str)
     print(f"\n✅ Savings goal '{goal_name}' created!")
     input("\nPress Enter to continue...")
 
 
-def view_savings_goals():
+@instrumented
+def view_savings_goals(session):
     """View all savings goals with progress."""
     clear_screen()
     print_header("SAVINGS GOALS")
     
-    if config.current_user not in config.savings_goals or not config.savings_goals[config.current_user]:
+    goals = services.get_savings_goals(session.username)
+    if not goals:
         print("No savings goals set.")
         input("\nPress Enter to continue...")
         return
     
-    currency = config.users[config.current_user]["currency"]
+    currency = session.currency
     
-    for goal_id, goal in config.savings_goals[config.current_user].items():
-        target = Decimal(goal["target"])
-        current = Decimal(goal["current"])
-        percentage = (current / target * 100) if target > 0 else 0
-        remaining = target - current
+    for goal in goals:
+        target, current = goal["target"], goal["current"]
+        percentage = goal["percentage"]
         
-        print(f"\n{goal['name']} ({goal_id})")
+        print(f"\n{goal['name']} ({goal['goal_id']})")
         print(f"Target: {currency}{target:,.2f} | Current: {currency}{current:,.2f} | "
-              f"Remaining: {currency}{remaining:,.2f}")
+              f"Remaining: {currency}{goal['remaining']:,.2f}")
         print(f"Deadline: {goal['deadline']}")
         
         # Progress bar
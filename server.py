@@ -0,0 +1,286 @@
+# ============================================================================
+# server.py - HTTP/JSON server mode
+# ============================================================================
+
+"""Asyncio HTTP/JSON front end over the service layer.
+
+Run with ``python server.py [port]``. Every request names its user with
+HTTP Basic credentials or a session token (``Authorization: Bearer``,
+from POST /sessions) and is served for that user alone, so one
+process serves many users at once. Connections are handled concurrently
+on the event loop with keep-alive; the service calls run on a pool of
+SERVER_THREADS worker threads so slow disk writes do not stall other
+connections. With SHARDED on, calls for different users also run in
+parallel (see services.user_lock).
+
+Routes (JSON bodies, JSON responses):
+    POST   /users                   register {username, name, password, currency}
+    POST   /sessions                log in {username, password}, returns {token}
+    DELETE /sessions                end the session of the Bearer token
+    GET    /dashboard[?month=]      dashboard figures
+    GET    /history[?start=&end=]   month-by-month figures (YYYY-MM bounds)
+    GET    /stats                   report cache counters
+    GET    /transactions[?start_date=&end_date=&category=&type=&min_amount=&max_amount=
+                         &payment_method=&text=&sort=&order=&offset=&limit=]
+                                    category may list several, comma separated;
+                                    sort is date, amount or category, order asc or desc
+    POST   /transactions            {type, amount, category, date, description, payment_method}
+    GET    /transactions/<id>
+    PATCH  /transactions/<id>       {amount, description}
+    DELETE /transactions/<id>
+    GET    /budgets[?month=]        budget status
+    PUT    /budgets/<category>      {amount}
+    GET    /goals
+    POST   /goals                   {name, target, deadline, current}
+"""
+
+import asyncio
+import base64
+import concurrent.futures
+import json
+import sys
+from decimal import Decimal
+from urllib.parse import urlsplit, parse_qsl, unquote
+import config
+import report_cache
+import services
+from data_manager import load_data, save_data
+
+
+MAX_BODY = 1024 * 1024
+
+REASONS = {200: "OK", 201: "Created", 204: "No Content", 400: "Bad Request",
+           401: "Unauthorized", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 500: "Internal Server Error"}
+
+SEARCH_PARAMS = ("start_date", "end_date", "category", "type", "min_amount", "max_amount",
+                 "payment_method", "text", "sort", "order", "offset", "limit")
+
+_executor = concurrent.futures.ThreadPoolExecutor(max_workers=config.SERVER_THREADS)
+
+
+class HTTPError(Exception):
+    """An error response with a status code."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def to_json(value):
+    """Encode a response body, writing Decimals as strings."""
+    def default(obj):
+        if isinstance(obj, Decimal):
+            return str(obj)
+        raise TypeError(f"{type(obj).__name__} is not JSON serialisable")
+    return json.dumps(value, default=default).encode()
+
+
+def request_session(headers):
+    """Return the Session for valid Basic credentials or token, or raise 401."""
+    auth = headers.get("authorization", "")
+    if auth[:7].lower() == "bearer ":
+        try:
+            return services.resume_session(auth[7:].strip())
+        except ValueError as e:
+            raise HTTPError(401, str(e))
+    if auth[:6].lower() == "basic ":
+        try:
+            username, _, password = base64.b64decode(auth[6:]).decode().partition(":")
+        except ValueError:
+            username = password = None
+        if username and services.authenticate(username, password):
+            return services.Session(username)
+    raise HTTPError(401, "Invalid credentials!")
+
+
+def public_user(user):
+    """Return a user's account details without the password hash."""
+    return {key: value for key, value in user.items() if key != "password"}
+
+
+def dispatch(method, path, query, headers, body):
+    """Route a request to the service layer and return (status, payload).
+
+    Runs on a worker thread.
+    """
+    parts = [unquote(part) for part in path.strip("/").split("/") if part]
+    if not parts:
+        raise HTTPError(404, "Not found")
+
+    if parts == ["users"]:
+        if method != "POST":
+            raise HTTPError(405, "Method not allowed")
+        user = services.register_user(body.get("username", ""), body.get("name", ""),
+                                      body.get("password", ""), body.get("currency", "USD"))
+        return 201, public_user(user)
+
+    if parts == ["sessions"] and method == "POST":
+        try:
+            session = services.login(body.get("username", ""), body.get("password", ""))
+        except ValueError as e:
+            raise HTTPError(401, str(e))
+        return 201, {"token": session.token}
+
+    session = request_session(headers)
+    username = session.username
+    resource, item = parts[0], "/".join(parts[1:]) or None
+
+    if parts == ["sessions"] and method == "DELETE":
+        services.logout(session)
+        return 204, None
+
+    if resource == "dashboard" and not item and method == "GET":
+        return 200, services.get_dashboard(username, query.get("month"))
+
+    if resource == "stats" and not item and method == "GET":
+        return 200, {"report_cache": report_cache.stats()}
+
+    if resource == "history" and not item and method == "GET":
+        return 200, services.get_history(username, query.get("start"), query.get("end"))
+
+    if resource == "transactions":
+        if item is None and method == "GET":
+            filters = {key: query[key] for key in SEARCH_PARAMS if key in query}
+            if "category" in filters:
+                filters["category"] = [c for c in filters["category"].split(",") if c]
+            if "type" in filters:
+                filters["trans_type"] = filters.pop("type")
+            if "order" in filters:
+                filters["descending"] = filters.pop("order").lower() == "desc"
+            if filters:
+                return 200, services.search_transactions(username, **filters)
+            return 200, services.list_transactions(username)
+        if item is None and method == "POST":
+            return 201, services.add_transaction(
+                username, body.get("type"), body.get("amount", ""), body.get("category"),
+                body.get("date"), body.get("description"), body.get("payment_method"))
+        if item is not None and method == "GET":
+            return 200, services.get_transaction(username, item)
+        if item is not None and method == "PATCH":
+            return 200, services.edit_transaction(username, item, body.get("amount"),
+                                                  body.get("description"))
+        if item is not None and method == "DELETE":
+            services.delete_transaction(username, item)
+            return 204, None
+        raise HTTPError(405, "Method not allowed")
+
+    if resource == "budgets":
+        if item is None and method == "GET":
+            return 200, services.get_budget_status(username, query.get("month"))
+        if item is not None and method == "PUT":
+            amount = services.set_budget(username, item, body.get("amount", ""))
+            return 200, {"category": item, "amount": amount}
+        raise HTTPError(405, "Method not allowed")
+
+    if resource == "goals" and item is None:
+        if method == "GET":
+            return 200, services.get_savings_goals(username)
+        if method == "POST":
+            return 201, services.add_savings_goal(username, body.get("name", ""),
+                                                  body.get("target", ""), body.get("deadline", ""),
+                                                  body.get("current", "0"))
+        raise HTTPError(405, "Method not allowed")
+
+    raise HTTPError(404, "Not found")
+
+
+async def read_request(reader):
+    """Read one request; returns None when the client closed the connection."""
+    request_line = await reader.readline()
+    if not request_line.strip():
+        return None
+    try:
+        method, target, version = request_line.decode("latin-1").split()
+    except ValueError:
+        raise HTTPError(400, "Malformed request line")
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    length = int(headers.get("content-length") or 0)
+    if length > MAX_BODY:
+        raise HTTPError(413, "Request body too large")
+    body = {}
+    if length:
+        try:
+            body = json.loads(await reader.readexactly(length))
+        except ValueError:
+            raise HTTPError(400, "Request body must be JSON")
+        if not isinstance(body, dict):
+            raise HTTPError(400, "Request body must be a JSON object")
+
+    url = urlsplit(target)
+    keep_alive = (headers.get("connection", "").lower() != "close"
+                  and version.upper() == "HTTP/1.1")
+    return method.upper(), url.path, dict(parse_qsl(url.query)), headers, body, keep_alive
+
+
+def write_response(writer, status, payload, keep_alive):
+    """Write a JSON response."""
+    body = b"" if status == 204 else to_json(payload)
+    head = (f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    writer.write(head.encode("latin-1") + body)
+
+
+async def handle_connection(reader, writer):
+    """Serve requests on one connection until it closes."""
+    loop = asyncio.get_running_loop()
+    keep_alive = True
+    try:
+        while keep_alive:
+            request = None
+            try:
+                request = await read_request(reader)
+                if request is None:
+                    break
+                method, path, query, headers, body, keep_alive = request
+                status, payload = await loop.run_in_executor(
+                    _executor, dispatch, method, path, query, headers, body)
+            except (asyncio.IncompleteReadError, ConnectionError):
+                break
+            except HTTPError as e:
+                status, payload = e.status, {"error": str(e)}
+            except ValueError as e:
+                status, payload = 400, {"error": str(e)}
+            except Exception as e:
+                status, payload = 500, {"error": str(e)}
+            if request is None:
+                # The request could not be parsed, so the stream is out of step
+                keep_alive = False
+            write_response(writer, status, payload, keep_alive)
+            await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(host="127.0.0.1", port=8080):
+    """Load the data and serve until cancelled, saving on shutdown."""
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(_executor, load_data)
+    server = await asyncio.start_server(handle_connection, host, port)
+    print(f"Serving on http://{host}:{port}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        # Let running calls finish so the final save sees every change
+        await loop.run_in_executor(None, _executor.shutdown)
+        save_data()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(serve(port=int(sys.argv[1]) if len(sys.argv) > 1 else 8080))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,700 @@
+# ============================================================================
+# services.py - Non-interactive service layer
+# ============================================================================
+
+"""Finance operations as plain functions returning data.
+
+Nothing here reads input or prints; the menus in the other modules are
+thin clients over these functions, and the same calls can be driven by
+scripts, batch jobs or a server. Invalid requests raise ValueError with
+a message suitable for showing to the user.
+
+Every call names the user it acts for, so there is no "current user":
+clients keep a Session per login or request. Calls hold the lock of the
+shard their user's files live in while they run (see user_lock), which
+makes them safe to use from several threads: in the sharded layout calls
+for different users run in parallel, while in the flat layout and with
+SQLite every user shares one shard and calls take turns.
+
+The stores and indexes stay process-wide dicts in config, shared by all
+sessions; a Session only names its user. Thread safety comes from the
+shard locks above, and other processes' changes are picked up through
+data_manager.refresh(), not from a per-call context object.
+"""
+
+import datetime
+import functools
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+import uuid
+from decimal import Decimal
+import config
+import data_manager
+import importer
+import query
+import report_cache
+from utils import (validate_amount, validate_date, validate_month, validate_username,
+                   months_between)
+
+
+ROLLING_WINDOWS = (3, 6, 12)  # months averaged in get_history()
+
+# Verified logins and session tokens (see authenticate and login)
+_verified = {}   # HMAC of username and password -> (stored hash, expiry)
+_tokens = {}     # session token -> (username, expiry)
+_cache_secret = os.urandom(32)
+_cache_lock = threading.Lock()
+
+# Shard owner -> lock; the global owner None (users, and everything in
+# the flat layout or SQLite) uses config.data_lock
+_owner_locks = {None: config.data_lock}
+
+
+class Session:
+    """The signed-in user that one client's calls are made for."""
+
+    def __init__(self, username, token=None):
+        self.username = username
+        self.token = token
+
+    @property
+    def user(self):
+        return config.users[self.username]
+
+    @property
+    def name(self):
+        return self.user["name"]
+
+    @property
+    def currency(self):
+        return self.user["currency"]
+
+
+def user_lock(username):
+    """Return the lock serialising calls on the shard holding a user's data.
+    
+    A thread holding it may take config.data_lock as well, but never the
+    lock of another shard.
+    """
+    owner = data_manager.store_owner("transactions", username)
+    lock = _owner_locks.get(owner)
+    if lock is None:
+        lock = _owner_locks.setdefault(owner, threading.RLock())
+    return lock
+
+
+def locked(func):
+    """Run a service call, whose first argument is the username, under user_lock."""
+    @functools.wraps(func)
+    def wrapper(username, *args, **kwargs):
+        with user_lock(username):
+            return func(username, *args, **kwargs)
+    return wrapper
+
+
+def hash_password(password, salt=None, iterations=None):
+    """Hash a password with salted PBKDF2-SHA256.
+    
+    Returns "pbkdf2_sha256$<iterations>$<salt>$<digest>" with hex fields;
+    a fresh random salt is used unless one is given.
+    """
+    iterations = iterations or config.PASSWORD_ITERATIONS
+    salt = salt if salt is not None else os.urandom(16)
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode(), salt, iterations)
+    return f"pbkdf2_sha256${iterations}${salt.hex()}${digest.hex()}"
+
+
+def verify_password(password, stored):
+    """Check a password against a stored hash; returns (matches, needs_rehash).
+    
+    Legacy unsalted SHA-256 hashes, and PBKDF2 hashes made with fewer
+    than PASSWORD_ITERATIONS rounds, match as before but need rehashing.
+    """
+    if "$" not in stored:
+        legacy = hashlib.sha256(password.encode()).hexdigest()
+        return hmac.compare_digest(legacy, stored), True
+    try:
+        scheme, iterations, salt, _ = stored.split("$")
+        iterations, salt = int(iterations), bytes.fromhex(salt)
+    except ValueError:
+        return False, False
+    if scheme != "pbkdf2_sha256":
+        return False, False
+    matches = hmac.compare_digest(hash_password(password, salt, iterations), stored)
+    return matches, iterations < config.PASSWORD_ITERATIONS
+
+
+def _remember(cache, key, value):
+    """Add an entry to a bounded cache, dropping the oldest when full."""
+    with _cache_lock:
+        cache.pop(key, None)
+        cache[key] = value
+        while len(cache) > config.AUTH_CACHE_SIZE:
+            cache.pop(next(iter(cache)))
+
+
+def register_user(username, name, password, currency="USD"):
+    """Create a user account and return it."""
+    if not validate_username(username):
+        raise ValueError("Invalid username! Use at most 64 characters, without "
+                         "'/', '\\', ':', '..' or a leading '.'")
+    if not name:
+        raise ValueError("Name cannot be empty!")
+    if len(password) < 4:
+        raise ValueError("Password must be at least 4 characters!")
+    password_hash = hash_password(password)
+
+    with config.data_lock:
+        if username in config.users:
+            raise ValueError("Username already exists or is invalid!")
+        config.users[username] = {
+            "user_id": str(uuid.uuid4()),
+            "name": name,
+            "password": password_hash,
+            "currency": currency or "USD",
+            "created_date": str(datetime.date.today())
+        }
+        data_manager.record_change("users", username)
+        return config.users[username]
+
+
+def authenticate(username, password):
+    """Return True if the username and password match an account.
+    
+    Verified credentials are remembered for SESSION_TTL seconds, keyed
+    by an HMAC under a per-process secret rather than the password, so
+    repeated requests skip the deliberately slow KDF; a password change
+    invalidates the entry. Outdated hashes are upgraded on success. The
+    KDF runs without holding config.data_lock.
+    """
+    with config.data_lock:
+        user = config.users.get(username)
+        stored = user["password"] if user else None
+    if stored is None:
+        return False
+
+    key = hmac.new(_cache_secret, f"{username}\0{password}".encode(), "sha256").digest()
+    cached = _verified.get(key)
+    if cached and cached[0] == stored and cached[1] > time.monotonic():
+        return True
+
+    matches, needs_rehash = verify_password(password, stored)
+    if not matches:
+        return False
+    if needs_rehash:
+        upgraded = hash_password(password)
+        with config.data_lock:
+            user = config.users.get(username)
+            if user is not None and user["password"] == stored:
+                config.users[username] = dict(user, password=upgraded)
+                try:
+                    data_manager.record_change("users", username, old=user)
+                    stored = upgraded
+                except Exception:
+                    # The old hash still verifies; the upgrade is retried next login
+                    pass
+    _remember(_verified, key, (stored, time.monotonic() + config.SESSION_TTL))
+    return True
+
+
+def login(username, password):
+    """Return a Session, with a new session token, for valid credentials."""
+    if not authenticate(username, password):
+        raise ValueError("Invalid credentials!")
+    token = secrets.token_urlsafe(32)
+    _remember(_tokens, token, (username, time.monotonic() + config.SESSION_TTL))
+    return Session(username, token)
+
+
+def resume_session(token):
+    """Return the Session for a live session token."""
+    entry = _tokens.get(token)
+    with config.data_lock:
+        known = entry is not None and entry[0] in config.users
+    if not known or entry[1] <= time.monotonic():
+        with _cache_lock:
+            _tokens.pop(token, None)
+        raise ValueError("Session expired or invalid!")
+    return Session(entry[0], token)
+
+
+def logout(session):
+    """End a session, invalidating its token."""
+    with _cache_lock:
+        _tokens.pop(session.token, None)
+
+
+@locked
+def get_user(username):
+    """Return a user's account details."""
+    with config.data_lock:
+        user = config.users.get(username)
+    if user is None:
+        raise ValueError("User not found!")
+    return user
+
+
+@locked
+def add_transaction(username, trans_type, amount, category, date=None,
+                    description="No description", payment_method="Cash"):
+    """Validate and store a new transaction, returning it."""
+    if trans_type == "income":
+        categories = config.INCOME_CATEGORIES
+    elif trans_type == "expense":
+        categories = config.EXPENSE_CATEGORIES
+    else:
+        raise ValueError("Invalid choice!")
+
+    amount = validate_amount(str(amount))
+    if not amount:
+        raise ValueError("Invalid amount!")
+    if category not in categories:
+        raise ValueError("Invalid category!")
+    date = date or str(datetime.date.today())
+    if not validate_date(date):
+        raise ValueError("Invalid date format!")
+
+    transaction = {
+        "transaction_id": data_manager.next_ids("TXN")[0],
+        "user_id": get_user(username)["user_id"],
+        "username": username,
+        "type": trans_type,
+        "amount": str(amount),
+        "category": category,
+        "date": date,
+        "description": description or "No description",
+        "payment_method": payment_method or "Cash"
+    }
+    data_manager.store_transaction(transaction)
+    return transaction
+
+
+@locked
+def get_transaction(username, trans_id):
+    """Return one of the user's transactions."""
+    trans = data_manager.get_transaction(trans_id, username)
+    if trans is None:
+        raise ValueError("Transaction not found!")
+    if trans["username"] != username:
+        raise ValueError("Access denied!")
+    return trans
+
+
+@locked
+def edit_transaction(username, trans_id, amount=None, description=None):
+    """Change a transaction's amount and/or description, returning it.
+
+    An invalid amount is ignored, as in the interactive editor.
+    """
+    trans = dict(get_transaction(username, trans_id))
+    if amount:
+        amount = validate_amount(str(amount))
+        if amount:
+            trans["amount"] = str(amount)
+    if description:
+        trans["description"] = description
+    data_manager.store_transaction(trans)
+    return trans
+
+
+@locked
+def delete_transaction(username, trans_id):
+    """Delete one of the user's transactions."""
+    get_transaction(username, trans_id)
+    data_manager.remove_transaction(trans_id, username)
+
+
+@locked
+def list_transactions(username, newest_first=True):
+    """Return all of a user's transactions in date order."""
+    data_manager.refresh(username)
+    return data_manager.get_user_transactions(username, newest_first=newest_first)
+
+
+def _page_key(trans):
+    """Return the (date, id) cursor key of a transaction."""
+    return trans["date"], trans["transaction_id"]
+
+
+@locked
+def page_transactions(username, page_size=None, before=None, after=None):
+    """Return one page of the user's transactions, newest first.
+    
+    Pages are reached through cursors: before is the (date, id) of the
+    last row shown, to page to older transactions, or a YYYY-MM-DD date
+    to jump to; after is the (date, id) of the first row shown, to page
+    to newer ones. page_size defaults to PAGE_SIZE. Returns
+    {"transactions", "has_older", "has_newer", "page_size"}.
+    """
+    try:
+        page_size = config.PAGE_SIZE if page_size is None else int(page_size)
+    except (TypeError, ValueError):
+        raise ValueError("Page size must be a whole number!")
+    if page_size < 1:
+        raise ValueError("Page size must be at least 1!")
+    if isinstance(before, str):
+        if not validate_date(before):
+            raise ValueError("Invalid date format!")
+        before = (before, None)
+    
+    data_manager.refresh(username)
+    # One extra row tells whether there is more in the direction of travel
+    rows = data_manager.get_transaction_page(username, page_size + 1, before, after)
+    if not rows and before is not None:
+        # Nothing that old: show the oldest page instead
+        after, before = (before[0], None), None
+        rows = data_manager.get_transaction_page(username, page_size + 1, after=after)
+    if after is not None:
+        has_newer, rows = len(rows) > page_size, rows[-page_size:]
+        older = _page_key(rows[-1]) if rows else (after[0], None)
+        has_older = bool(data_manager.get_transaction_page(username, 1, before=older))
+    else:
+        has_older, rows = len(rows) > page_size, rows[:page_size]
+        newer = _page_key(rows[0]) if rows else before
+        has_newer = newer is not None and bool(
+            data_manager.get_transaction_page(username, 1, after=newer))
+    return {"transactions": rows, "has_older": has_older, "has_newer": has_newer,
+            "page_size": page_size}
+
+
+@locked
+def search_transactions(username, start_date=None, end_date=None, category=None,
+                        min_amount=None, max_amount=None, text=None, trans_type=None,
+                        payment_method=None, sort="date", descending=False,
+                        offset=0, limit=None):
+    """Return a user's transactions matching every given filter.
+    
+    category may be one category or a list of them. Filters are combined
+    in a single pass by query.run(), which also orders the results by
+    sort ("date", "amount" or "category") and returns the offset/limit
+    page.
+    """
+    for date in (start_date, end_date):
+        if date and not validate_date(date):
+            raise ValueError("Invalid date format!")
+    amounts = []
+    for amount in (min_amount, max_amount):
+        if amount is not None:
+            amount = validate_amount(str(amount))
+            if not amount:
+                raise ValueError("Invalid amount!")
+        amounts.append(amount)
+    min_amount, max_amount = amounts
+    if trans_type and trans_type not in ("income", "expense"):
+        raise ValueError("Invalid transaction type!")
+    if sort not in query.SORT_KEYS:
+        raise ValueError("Invalid sort field!")
+    try:
+        offset = int(offset)
+        limit = int(limit) if limit is not None else None
+    except (TypeError, ValueError):
+        raise ValueError("Offset and limit must be whole numbers!")
+    if offset < 0 or (limit is not None and limit < 0):
+        raise ValueError("Offset and limit must not be negative!")
+    data_manager.refresh(username)
+    return list(query.run(username, start_date, end_date, category, trans_type,
+                          min_amount, max_amount, payment_method, text,
+                          sort, descending, offset, limit))
+
+
+@locked
+def set_budget(username, category, amount):
+    """Set the monthly budget for an expense category, returning the amount."""
+    if category not in config.EXPENSE_CATEGORIES:
+        raise ValueError("Invalid category!")
+    amount = validate_amount(str(amount))
+    if not amount:
+        raise ValueError("Invalid amount!")
+
+    data_manager.ensure_loaded("budgets", username)
+    old = config.budgets.get(username)
+    budgets = dict(old or {})
+    budgets[category] = str(amount)
+    config.budgets[username] = budgets
+    data_manager.record_change("budgets", username, old=old)
+    return amount
+
+
+@locked
+def get_budget_status(username, month=None):
+    """Return budget, spending and status per budgeted category for a month.
+
+    status is "good" up to 80% of the budget, "warning" up to 100% and
+    "over" beyond that. Results are cached until the user's budgets or
+    the month's transactions change.
+    """
+    if month and not validate_month(month):
+        raise ValueError("Invalid month format!")
+    month = month or datetime.date.today().strftime("%Y-%m")
+    data_manager.refresh(username)
+    return report_cache.get(username, "budget_status", month, (month, month),
+                            lambda: _budget_status(username, month))
+
+
+def _budget_status(username, month):
+    """Compute get_budget_status() for a month."""
+    data_manager.ensure_loaded("budgets", username)
+    user_budgets = config.budgets.get(username, {})
+
+    category_spending = {}
+    if user_budgets:
+        for (trans_type, cat), amount in data_manager.get_month_totals(username, month).items():
+            if trans_type == "expense":
+                category_spending[cat] = amount
+
+    status = []
+    for category, budget_str in user_budgets.items():
+        budget = Decimal(budget_str)
+        spent = category_spending.get(category, Decimal("0"))
+        percentage = (spent / budget * 100) if budget > 0 else 0
+        if percentage <= 80:
+            level = "good"
+        elif percentage <= 100:
+            level = "warning"
+        else:
+            level = "over"
+        status.append({
+            "category": category,
+            "budget": budget,
+            "spent": spent,
+            "remaining": budget - spent,
+            "percentage": percentage,
+            "status": level
+        })
+    return status
+
+
+def calculate_health_score(income, expenses, savings):
+    """Calculate financial health score (0-100)."""
+    if income == 0:
+        return 0
+
+    savings_rate = (savings / income) * 100 if income > 0 else 0
+    expense_ratio = (expenses / income) * 100 if income > 0 else 100
+
+    # Score based on savings rate and expense ratio
+    score = 0
+
+    if savings_rate >= 30:
+        score += 50
+    elif savings_rate >= 20:
+        score += 40
+    elif savings_rate >= 10:
+        score += 30
+    elif savings_rate >= 0:
+        score += 20
+    else:
+        score += 0
+
+    if expense_ratio <= 50:
+        score += 50
+    elif expense_ratio <= 70:
+        score += 40
+    elif expense_ratio <= 90:
+        score += 30
+    elif expense_ratio <= 100:
+        score += 20
+    else:
+        score += 10
+
+    return min(100, score)
+
+
+@locked
+def get_dashboard(username, month=None):
+    """Return the dashboard figures for a user's month (default: current).
+    
+    The balance is the running balance at the end of the month: every
+    income less every expense up to then. Results are cached (see
+    report_cache) until a transaction up to the month changes.
+    """
+    if month and not validate_month(month):
+        raise ValueError("Invalid month format!")
+    month = month or datetime.date.today().strftime("%Y-%m")
+    data_manager.refresh(username)
+    return report_cache.get(username, "dashboard", month, (None, month),
+                            lambda: _dashboard(username, month))
+
+
+def _dashboard(username, month):
+    """Compute get_dashboard() for a month."""
+    monthly = data_manager.get_monthly_totals(username, end_month=month)
+
+    total_income = Decimal("0")
+    total_expenses = Decimal("0")
+    category_totals = {}
+    for (trans_type, category), amount in monthly.get(month, {}).items():
+        if trans_type == "income":
+            total_income += amount
+        else:
+            total_expenses += amount
+            category_totals[category] = category_totals.get(category, Decimal("0")) + amount
+
+    net_savings = total_income - total_expenses
+    balance = sum((amount if trans_type == "income" else -amount
+                   for totals in monthly.values()
+                   for (trans_type, _), amount in totals.items()), Decimal("0"))
+    top_categories = [
+        {"category": cat, "amount": amount,
+         "percentage": (amount / total_expenses * 100) if total_expenses > 0 else 0}
+        for cat, amount in sorted(category_totals.items(), key=lambda x: x[1], reverse=True)[:3]
+    ]
+    return {
+        "month": month,
+        "income": total_income,
+        "expenses": total_expenses,
+        "net_savings": net_savings,
+        "balance": balance,
+        "top_categories": top_categories,
+        "health_score": calculate_health_score(total_income, total_expenses, net_savings)
+    }
+
+
+@locked
+def get_history(username, start_month=None, end_month=None):
+    """Return month-by-month figures for a range of a user's history.
+    
+    Each month has its income, expenses and net, the totals by category,
+    the running balance at its end, rolling averages over the last
+    ROLLING_WINDOWS months and the same month a year earlier. All of it
+    comes from the monthly aggregates, so the cost grows with the number
+    of months rather than transactions. The range defaults to the first
+    month with transactions up to the current month. Results are cached
+    until a transaction up to the end month changes.
+    """
+    for month in (start_month, end_month):
+        if month and not validate_month(month):
+            raise ValueError("Invalid month format!")
+    end_month = end_month or datetime.date.today().strftime("%Y-%m")
+    if start_month and start_month > end_month:
+        raise ValueError("Start month must not be after end month!")
+    data_manager.refresh(username)
+    return report_cache.get(username, "history", (start_month, end_month), (None, end_month),
+                            lambda: _history(username, start_month, end_month))
+
+
+def _history(username, start_month, end_month):
+    """Compute get_history() for a range; start_month may be None."""
+    # Earlier months still count towards balances, averages and comparisons
+    monthly = data_manager.get_monthly_totals(username, end_month=end_month)
+    first = min([end_month, start_month or end_month] + list(monthly))
+    start_month = start_month or first
+
+    months = []
+    balance = Decimal("0")
+    for month in months_between(first, end_month):
+        income, expenses = {}, {}
+        for (trans_type, category), amount in monthly.get(month, {}).items():
+            by_category = income if trans_type == "income" else expenses
+            by_category[category] = by_category.get(category, Decimal("0")) + amount
+        total_income = sum(income.values(), Decimal("0"))
+        total_expenses = sum(expenses.values(), Decimal("0"))
+        balance += total_income - total_expenses
+        months.append({
+            "month": month,
+            "income": total_income,
+            "expenses": total_expenses,
+            "net": total_income - total_expenses,
+            "income_by_category": income,
+            "expenses_by_category": expenses,
+            "balance": balance
+        })
+
+    for i, row in enumerate(months):
+        row["rolling"] = {}
+        for window in ROLLING_WINDOWS:
+            recent = months[max(0, i - window + 1):i + 1]
+            row["rolling"][window] = {
+                key: sum((r[key] for r in recent), Decimal("0")) / len(recent)
+                for key in ("income", "expenses", "net")}
+        row["year_ago"] = None
+        if i >= 12:
+            previous = months[i - 12]
+            row["year_ago"] = {
+                "income": previous["income"],
+                "expenses": previous["expenses"],
+                "income_change": _percent_change(row["income"], previous["income"]),
+                "expenses_change": _percent_change(row["expenses"], previous["expenses"])
+            }
+
+    shown = [row for row in months if row["month"] >= start_month]
+    return {
+        "start_month": start_month,
+        "end_month": end_month,
+        "opening_balance": shown[0]["balance"] - shown[0]["net"] if shown else balance,
+        "closing_balance": balance,
+        "months": shown
+    }
+
+
+def _percent_change(now, before):
+    """Return the change from before to now in percent, or None from zero."""
+    return (now - before) / before * 100 if before else None
+
+
+@locked
+def add_savings_goal(username, name, target, deadline, current="0"):
+    """Create a savings goal and return it."""
+    if not name:
+        raise ValueError("Goal name cannot be empty!")
+    target = validate_amount(str(target))
+    if not target:
+        raise ValueError("Invalid amount!")
+    if not validate_date(deadline):
+        raise ValueError("Invalid date!")
+    current = validate_amount(str(current or "0"))
+    if current is None:
+        current = Decimal("0")
+
+    data_manager.ensure_loaded("savings_goals", username)
+    goal_id = data_manager.next_ids("GOAL")[0]
+    goal = {
+        "goal_id": goal_id,
+        "name": name,
+        "target": str(target),
+        "current": str(current),
+        "deadline": deadline,
+        "created_date": str(datetime.date.today())
+    }
+    old = config.savings_goals.get(username)
+    goals = dict(old or {})
+    goals[goal_id] = goal
+    config.savings_goals[username] = goals
+    data_manager.record_change("savings_goals", username, old=old)
+    return goal
+
+
+@locked
+def get_savings_goals(username):
+    """Return a user's savings goals with their progress."""
+    data_manager.ensure_loaded("savings_goals", username)
+    goals = []
+    for goal_id, goal in config.savings_goals.get(username, {}).items():
+        target = Decimal(goal["target"])
+        current = Decimal(goal["current"])
+        goals.append(dict(goal, goal_id=goal_id, target=target, current=current,
+                          remaining=target - current,
+                          percentage=(current / target * 100) if target > 0 else 0))
+    return goals
+
+
+@locked
+def export_transactions(username, filename, start_date=None, end_date=None,
+                        category=None, compress=False):
+    """Write a user's transactions to a CSV file, returning the row count."""
+    for date in (start_date, end_date):
+        if date and not validate_date(date):
+            raise ValueError("Invalid date format!")
+    return data_manager.write_csv(username, filename, start_date, end_date,
+                                  category, compress)
+
+
+@locked
+def import_transactions(username, filename):
+    """Import a CSV or OFX statement, returning (imported, row errors)."""
+    get_user(username)
+    return importer.import_file(filename, username)
@@ -0,0 +1,344 @@
+# ============================================================================
+# sqlite_store.py - SQLite storage backend
+# ============================================================================
+
+"""SQLite storage backend used when config.STORAGE_BACKEND is "sqlite"."""
+
+import sqlite3
+from decimal import Decimal
+import config
+from instrumentation import add_rows
+
+
+_connection = None
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    user_id TEXT,
+    name TEXT,
+    password TEXT,
+    currency TEXT,
+    created_date TEXT
+);
+CREATE TABLE IF NOT EXISTS transactions (
+    transaction_id TEXT PRIMARY KEY,
+    user_id TEXT,
+    username TEXT NOT NULL,
+    type TEXT,
+    amount TEXT,
+    category TEXT COLLATE NOCASE,
+    date TEXT,
+    description TEXT,
+    payment_method TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_transactions_user_date ON transactions (username, date);
+CREATE INDEX IF NOT EXISTS idx_transactions_user_category ON transactions (username, category);
+CREATE INDEX IF NOT EXISTS idx_transactions_user_type ON transactions (username, type);
+-- Per-month aggregates in whole cents, kept up to date by the triggers below
+CREATE TABLE IF NOT EXISTS monthly_totals (
+    username TEXT NOT NULL,
+    month TEXT NOT NULL,
+    type TEXT NOT NULL,
+    category TEXT NOT NULL COLLATE NOCASE,
+    cents INTEGER NOT NULL,
+    PRIMARY KEY (username, month, type, category)
+);
+CREATE TRIGGER IF NOT EXISTS monthly_totals_insert AFTER INSERT ON transactions BEGIN
+    INSERT INTO monthly_totals VALUES (NEW.username, substr(NEW.date, 1, 7), NEW.type,
+                                       NEW.category, CAST(ROUND(NEW.amount * 100) AS INTEGER))
+    ON CONFLICT DO UPDATE SET cents = cents + excluded.cents;
+END;
+CREATE TRIGGER IF NOT EXISTS monthly_totals_delete AFTER DELETE ON transactions BEGIN
+    UPDATE monthly_totals SET cents = cents - CAST(ROUND(OLD.amount * 100) AS INTEGER)
+    WHERE username = OLD.username AND month = substr(OLD.date, 1, 7)
+      AND type = OLD.type AND category = OLD.category;
+    DELETE FROM monthly_totals WHERE username = OLD.username AND cents = 0;
+END;
+CREATE TABLE IF NOT EXISTS budgets (
+    username TEXT NOT NULL,
+    category TEXT NOT NULL,
+    amount TEXT,
+    PRIMARY KEY (username, category)
+);
+CREATE TABLE IF NOT EXISTS savings_goals (
+    username TEXT NOT NULL,
+    goal_id TEXT NOT NULL,
+    name TEXT,
+    target TEXT,
+    current TEXT,
+    deadline TEXT,
+    created_date TEXT,
+    PRIMARY KEY (username, goal_id)
+);
+"""
+
+SCHEMA_VERSION = 1
+
+USER_FIELDS = ["user_id", "name", "password", "currency", "created_date"]
+TRANSACTION_FIELDS = ["transaction_id", "user_id", "username", "type", "amount",
+                      "category", "date", "description", "payment_method"]
+GOAL_FIELDS = ["goal_id", "name", "target", "current", "deadline", "created_date"]
+
+
+def get_connection():
+    """Open the database on first use and make sure the schema exists."""
+    global _connection
+    if _connection is None:
+        # Shared across threads; callers serialise access with config.data_lock
+        _connection = sqlite3.connect(config.DATABASE_FILE, check_same_thread=False)
+        _connection.row_factory = sqlite3.Row
+        # Rows removed by INSERT OR REPLACE must fire the delete trigger
+        _connection.execute("PRAGMA recursive_triggers = ON")
+        _connection.executescript(SCHEMA)
+        if _connection.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+            _migrate(_connection)
+    return _connection
+
+
+def data_version():
+    """Return a number that changes whenever another connection commits."""
+    return get_connection().execute("PRAGMA data_version").fetchone()[0]
+
+
+def _migrate(conn):
+    """Bring a database written by an older version up to SCHEMA_VERSION."""
+    with conn:
+        # Version 1 added monthly_totals; fill it from existing transactions
+        conn.execute("DELETE FROM monthly_totals")
+        conn.execute(
+            "INSERT INTO monthly_totals"
+            " SELECT username, substr(date, 1, 7), type, category,"
+            " SUM(CAST(ROUND(amount * 100) AS INTEGER)) FROM transactions"
+            " GROUP BY username, substr(date, 1, 7), type, category")
+        conn.execute("DELETE FROM monthly_totals WHERE cents = 0")
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+
+def close_connection():
+    """Close the database connection if it is open."""
+    global _connection
+    if _connection is not None:
+        _connection.close()
+        _connection = None
+
+
+def load_users():
+    """Return all users keyed by username."""
+    rows = get_connection().execute("SELECT * FROM users")
+    return {row["username"]: {field: row[field] for field in USER_FIELDS}
+            for row in rows}
+
+
+def load_budgets():
+    """Return budgets as {username: {category: amount}}."""
+    budgets = {}
+    for row in get_connection().execute("SELECT * FROM budgets"):
+        budgets.setdefault(row["username"], {})[row["category"]] = row["amount"]
+    return budgets
+
+
+def load_goals():
+    """Return savings goals as {username: {goal_id: goal}}."""
+    goals = {}
+    for row in get_connection().execute("SELECT * FROM savings_goals"):
+        goals.setdefault(row["username"], {})[row["goal_id"]] = {
+            field: row[field] for field in GOAL_FIELDS}
+    return goals
+
+
+def get_transaction(trans_id):
+    """Return one transaction as a dict, or None if it does not exist."""
+    row = get_connection().execute(
+        "SELECT * FROM transactions WHERE transaction_id = ?", (trans_id,)).fetchone()
+    return dict(row) if row else None
+
+
+def transaction_ids():
+    """Yield every stored transaction id."""
+    for row in get_connection().execute("SELECT transaction_id FROM transactions"):
+        yield row[0]
+
+
+def iter_transactions(username, start_date=None, end_date=None,
+                      category=None, trans_type=None, newest_first=False):
+    """Yield a user's transactions matching the filters, ordered by date."""
+    sql = "SELECT * FROM transactions WHERE username = ?"
+    params = [username]
+    if start_date:
+        sql += " AND date >= ?"
+        params.append(start_date)
+    if end_date:
+        sql += " AND date <= ?"
+        params.append(end_date)
+    if category:
+        sql += " AND category = ?"
+        params.append(category)
+    if trans_type:
+        sql += " AND type = ?"
+        params.append(trans_type)
+    sql += " ORDER BY date DESC" if newest_first else " ORDER BY date"
+    for row in get_connection().execute(sql, params):
+        add_rows(1)
+        yield dict(row)
+
+
+ORDER_BY = {
+    "date": "date {0}, transaction_id {0}",
+    "amount": "CAST(amount AS REAL) {0}, date {0}, transaction_id {0}",
+    "category": "category {0}, date {0}, transaction_id {0}"
+}
+
+
+def select_transactions(username, start_date=None, end_date=None, categories=None,
+                        trans_type=None, min_amount=None, max_amount=None,
+                        payment_method=None, trans_ids=None, order_by="date",
+                        descending=False, offset=0, limit=None):
+    """Yield a user's transactions matching every given filter in one query.
+    
+    categories and trans_ids are collections; category and payment
+    method match case-insensitively. SQLite picks the index to start
+    from and applies the ordering and offset/limit itself.
+    """
+    sql = "SELECT * FROM transactions WHERE username = ?"
+    params = [username]
+    if start_date:
+        sql += " AND date >= ?"
+        params.append(start_date)
+    if end_date:
+        sql += " AND date <= ?"
+        params.append(end_date)
+    if categories:
+        sql += f" AND category IN ({', '.join('?' * len(categories))})"
+        params.extend(categories)
+    if trans_type:
+        sql += " AND type = ?"
+        params.append(trans_type)
+    if min_amount is not None:
+        sql += " AND CAST(amount AS REAL) >= ?"
+        params.append(float(min_amount))
+    if max_amount is not None:
+        sql += " AND CAST(amount AS REAL) <= ?"
+        params.append(float(max_amount))
+    if payment_method:
+        sql += " AND payment_method = ? COLLATE NOCASE"
+        params.append(payment_method)
+    if trans_ids is not None:
+        sql += f" AND transaction_id IN ({', '.join('?' * len(trans_ids))})"
+        params.extend(trans_ids)
+    sql += " ORDER BY " + ORDER_BY[order_by].format("DESC" if descending else "ASC")
+    if limit is not None or offset:
+        sql += " LIMIT ? OFFSET ?"
+        params.extend([limit if limit is not None else -1, offset])
+    for row in get_connection().execute(sql, params):
+        add_rows(1)
+        yield dict(row)
+
+
+def transaction_page(username, count, before=None, after=None):
+    """Return up to count transactions next to a (date, id) key.
+    
+    With before, the rows just older than the key, newest first (an id
+    of None takes in the whole date); with after, the rows just newer
+    than it, oldest first. The (username, date) index serves both.
+    """
+    sql = "SELECT * FROM transactions WHERE username = ?"
+    params = [username]
+    if after is not None:
+        sql += " AND (date > ? OR (date = ? AND transaction_id > ?))"
+        params += [after[0], after[0], after[1]]
+        sql += " ORDER BY date, transaction_id"
+    else:
+        date, trans_id = before or (None, None)
+        if trans_id is not None:
+            sql += " AND (date < ? OR (date = ? AND transaction_id < ?))"
+            params += [date, date, trans_id]
+        elif date is not None:
+            sql += " AND date <= ?"
+            params.append(date)
+        sql += " ORDER BY date DESC, transaction_id DESC"
+    sql += " LIMIT ?"
+    params.append(count)
+    rows = [dict(row) for row in get_connection().execute(sql, params)]
+    add_rows(len(rows))
+    return rows
+
+
+def month_totals(username, month):
+    """Return {(type, category): total} for a user's YYYY-MM month."""
+    return monthly_totals(username, month, month).get(month, {})
+
+
+def monthly_totals(username, start_month=None, end_month=None):
+    """Return {month: {(type, category): total}} from the precomputed aggregates."""
+    sql = "SELECT month, type, category, cents FROM monthly_totals WHERE username = ?"
+    params = [username]
+    if start_month:
+        sql += " AND month >= ?"
+        params.append(start_month)
+    if end_month:
+        sql += " AND month <= ?"
+        params.append(end_month)
+    months = {}
+    for row in get_connection().execute(sql, params):
+        add_rows(1)
+        months.setdefault(row["month"], {})[(row["type"], row["category"])] = (
+            Decimal(row["cents"]).scaleb(-2))
+    return months
+
+
+def _write_record(conn, store, key, value):
+    """Replace the rows for one key of a store (a value of None deletes)."""
+    if store == "users":
+        conn.execute("DELETE FROM users WHERE username = ?", (key,))
+        if value is not None:
+            conn.execute("INSERT INTO users VALUES (?, ?, ?, ?, ?, ?)",
+                         [key] + [value.get(f) for f in USER_FIELDS])
+    elif store == "transactions":
+        conn.execute("DELETE FROM transactions WHERE transaction_id = ?", (key,))
+        if value is not None:
+            conn.execute("INSERT INTO transactions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                         [value.get(f) for f in TRANSACTION_FIELDS])
+    elif store == "budgets":
+        conn.execute("DELETE FROM budgets WHERE username = ?", (key,))
+        for category, amount in (value or {}).items():
+            conn.execute("INSERT INTO budgets VALUES (?, ?, ?)",
+                         (key, category, amount))
+    elif store == "savings_goals":
+        conn.execute("DELETE FROM savings_goals WHERE username = ?", (key,))
+        for goal in (value or {}).values():
+            conn.execute("INSERT INTO savings_goals VALUES (?, ?, ?, ?, ?, ?, ?)",
+                         [key] + [goal.get(f) for f in GOAL_FIELDS])
+    else:
+        raise ValueError(f"Unknown store: {store}")
+
+
+def save_record(store, key, value):
+    """Persist one changed record in its own transaction."""
+    conn = get_connection()
+    with conn:
+        _write_record(conn, store, key, value)
+
+
+def save_transactions(transactions):
+    """Insert or replace many transactions in one database transaction."""
+    conn = get_connection()
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO transactions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            ([t.get(f) for f in TRANSACTION_FIELDS] for t in transactions))
+
+
+def save_all(users, transactions, budgets, savings_goals):
+    """Write complete stores in a single database transaction."""
+    conn = get_connection()
+    with conn:
+        for username, user in users.items():
+            _write_record(conn, "users", username, user)
+        conn.executemany(
+            "INSERT OR REPLACE INTO transactions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            ([t.get(f) for f in TRANSACTION_FIELDS] for t in transactions.values()))
+        for username, user_budgets in budgets.items():
+            _write_record(conn, "budgets", username, user_budgets)
+        for username, goals in savings_goals.items():
+            _write_record(conn, "savings_goals", username, goals)
@@ -0,0 +1,59 @@
+"""Shared fixtures: every test runs in its own data directory."""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+import data_manager
+import report_cache
+import sqlite_store
+
+
+# Storage modes and the settings that select them
+MODES = {
+    "flat": {},
+    "sharded": {"SHARDED": True},
+    "sqlite": {"STORAGE_BACKEND": "sqlite"},
+    "nojournal": {"USE_JOURNAL": False},
+    "recordfile": {"USE_RECORD_FILE": True, "USE_JOURNAL": False}
+}
+DEFAULTS = {name: getattr(config, name)
+            for settings in MODES.values() for name in settings}
+
+
+def restart():
+    """Forget everything in memory, as a new process would start."""
+    sqlite_store.close_connection()
+    data_manager.load_data()
+
+
+@pytest.fixture
+def use_mode(tmp_path, monkeypatch):
+    """Return a function switching to a fresh data directory in a storage mode."""
+    monkeypatch.setattr(config, "PASSWORD_ITERATIONS", 1000)
+
+    def use(mode):
+        sqlite_store.close_connection()
+        report_cache.clear()
+        workdir = tmp_path / mode
+        workdir.mkdir()
+        monkeypatch.chdir(workdir)
+        for name, value in dict(DEFAULTS, **MODES[mode]).items():
+            monkeypatch.setattr(config, name, value)
+        data_manager.load_data()
+        return workdir
+
+    yield use
+    sqlite_store.close_connection()
+    report_cache.clear()
+
+
+@pytest.fixture(params=list(MODES))
+def mode(request, use_mode):
+    """Run a test once per storage mode."""
+    use_mode(request.param)
+    return request.param
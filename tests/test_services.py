@@ -0,0 +1,170 @@
+"""Service calls: searching, paging, reports and imports."""
+
+from decimal import Decimal
+
+import pytest
+
+import config
+import data_manager
+import report_cache
+import services
+import sqlite_store
+
+
+@pytest.fixture
+def alice(mode):
+    """A user with one transaction a day through January and February 2024."""
+    services.register_user("alice", "Alice", "secret")
+    for day in range(1, 60):
+        date = f"2024-01-{day:02d}" if day <= 31 else f"2024-02-{day - 31:02d}"
+        services.add_transaction("alice", "expense" if day % 2 else "income", f"{day}.50",
+                                 "Food" if day % 2 else "Salary", date,
+                                 f"uber ride {day}" if day % 5 == 0 else f"shop {day}",
+                                 "Card" if day % 3 else "Cash")
+    return "alice"
+
+
+def amounts(transactions):
+    """Return the amounts of transactions as Decimals."""
+    return [Decimal(t["amount"]) for t in transactions]
+
+
+def test_search_combines_filters(alice):
+    found = services.search_transactions(alice, start_date="2024-01-10", end_date="2024-02-10",
+                                         category="Food", min_amount="15", max_amount="40",
+                                         payment_method="card")
+    assert found
+    for trans in found:
+        assert "2024-01-10" <= trans["date"] <= "2024-02-10"
+        assert trans["category"] == "Food" and trans["payment_method"] == "Card"
+        assert Decimal("15") <= Decimal(trans["amount"]) <= Decimal("40")
+
+
+def test_search_text_and_prefix(alice):
+    assert len(services.search_transactions(alice, text="uber")) == 11
+    assert len(services.search_transactions(alice, text="ub* 10")) == 1
+    assert services.search_transactions(alice, text="nothing") == []
+
+
+def test_search_sorts_and_pages(alice):
+    everything = services.search_transactions(alice, sort="amount", descending=True)
+    assert amounts(everything) == sorted(amounts(everything), reverse=True)
+    page = services.search_transactions(alice, sort="amount", descending=True,
+                                        offset=5, limit=10)
+    assert page == everything[5:15]
+
+
+def test_search_min_amount_has_no_upper_bound(alice):
+    services.add_transaction(alice, "expense", "2000000000", "Food", "2024-01-15", "house")
+    found = services.search_transactions(alice, min_amount="1000")
+    assert amounts(found) == [Decimal("2000000000")]
+
+
+@pytest.mark.parametrize("amount", ["0", "-5", "abc", "1.005"])
+def test_search_rejects_invalid_amounts(alice, amount):
+    with pytest.raises(ValueError, match="Invalid amount"):
+        services.search_transactions(alice, min_amount=amount)
+    with pytest.raises(ValueError, match="Invalid amount"):
+        services.search_transactions(alice, max_amount=amount)
+
+
+def test_pages_cover_every_transaction_once(alice):
+    seen = []
+    page = services.page_transactions(alice, 7)
+    while True:
+        seen.extend(t["transaction_id"] for t in page["transactions"])
+        if not page["has_older"]:
+            break
+        last = page["transactions"][-1]
+        page = services.page_transactions(alice, 7, before=(last["date"],
+                                                                last["transaction_id"]))
+    newest_first = [t["transaction_id"] for t in services.list_transactions(alice)]
+    assert seen == newest_first
+
+    first = page["transactions"][0]
+    back = services.page_transactions(alice, 7, after=(first["date"], first["transaction_id"]))
+    assert back["has_newer"] and back["has_older"]
+
+
+def test_page_size_must_be_positive(alice):
+    with pytest.raises(ValueError):
+        services.page_transactions(alice, 0)
+
+
+def test_reports_follow_changes(alice):
+    january = services.get_dashboard(alice, "2024-01")
+    hits = report_cache.stats()["hits"]
+    assert services.get_dashboard(alice, "2024-01") is january
+    assert report_cache.stats()["hits"] == hits + 1
+
+    trans = services.add_transaction(alice, "expense", "100", "Food", "2024-01-20")
+    assert services.get_dashboard(alice, "2024-01")["expenses"] == january["expenses"] + 100
+    services.edit_transaction(alice, trans["transaction_id"], "50")
+    assert services.get_dashboard(alice, "2024-01")["expenses"] == january["expenses"] + 50
+    services.delete_transaction(alice, trans["transaction_id"])
+    assert services.get_dashboard(alice, "2024-01") == january
+
+
+def test_budget_status_levels(alice):
+    services.set_budget(alice, "Food", "300")
+    services.set_budget(alice, "Rent", "10")
+    status = {row["category"]: row for row in services.get_budget_status(alice, "2024-01")}
+    spent = sum(Decimal(f"{day}.50") for day in range(1, 32, 2))
+    assert status["Food"]["spent"] == spent
+    assert status["Food"]["status"] == "warning"
+    assert status["Rent"]["spent"] == 0 and status["Rent"]["status"] == "good"
+
+    services.set_budget(alice, "Food", "100")
+    status = {row["category"]: row for row in services.get_budget_status(alice, "2024-01")}
+    assert status["Food"]["status"] == "over"
+
+
+def test_history_balances(alice):
+    history = services.get_history(alice, "2024-01", "2024-02")
+    january, february = history["months"]
+    assert february["balance"] == january["net"] + february["net"]
+    assert history["closing_balance"] == services.get_dashboard(alice, "2024-02")["balance"]
+
+
+def test_month_totals_match_the_rows(alice):
+    totals = {}
+    for trans in services.list_transactions(alice):
+        if trans["date"].startswith("2024-02"):
+            group = (trans["type"], trans["category"])
+            totals[group] = totals.get(group, 0) + Decimal(trans["amount"])
+    assert data_manager.get_month_totals(alice, "2024-02") == totals
+    if config.STORAGE_BACKEND == "sqlite":
+        assert sqlite_store.month_totals(alice, "2024-02") == totals
+
+
+def test_import_csv(mode, tmp_path):
+    services.register_user("alice", "Alice", "secret")
+    statement = tmp_path / "statement.csv"
+    statement.write_text("Date,Amount,Description,Category\n"
+                         "2024-03-01,-12.50,Groceries shop,groceries\n"
+                         "2024-03-02,2500,Payroll,payroll\n"
+                         "2024-3-3,-1,Bad date,\n"
+                         "2024-03-04,0,Zero,\n")
+
+    imported, errors = services.import_transactions("alice", str(statement))
+    assert imported == 2 and len(errors) == 2
+    rows = services.list_transactions("alice", newest_first=False)
+    assert [(t["type"], t["category"], t["amount"]) for t in rows] == [
+        ("expense", "Food", "12.50"), ("income", "Salary", "2500")]
+
+
+@pytest.mark.parametrize("username", ["", ".hidden", "a/b", "a\\b", "..", "c:", "x" * 65])
+def test_register_rejects_unsafe_usernames(mode, username):
+    with pytest.raises(ValueError):
+        services.register_user(username, "Name", "secret")
+
+
+def test_login_and_sessions(mode):
+    services.register_user("alice", "Alice", "secret")
+    with pytest.raises(ValueError):
+        services.login("alice", "wrong")
+    session = services.login("alice", "secret")
+    assert services.resume_session(session.token).username == "alice"
+    services.logout(session)
+    with pytest.raises(ValueError):
+        services.resume_session(session.token)
@@ -0,0 +1,211 @@
+"""Persistence in every storage mode."""
+
+import os
+import subprocess
+import sys
+from decimal import Decimal
+
+import pytest
+
+import config
+import data_manager
+import services
+from conftest import MODES, restart
+
+
+def add_sample_data():
+    """Create two users with transactions over several months, a budget and a goal."""
+    services.register_user("alice", "Alice", "secret")
+    services.register_user("bob", "Bob", "secret")
+    ids = []
+    for i in range(24):
+        month = i % 6 + 1
+        if i % 3 == 0:
+            trans = services.add_transaction("alice", "income", f"{100 + i}.50", "Salary",
+                                             f"2024-{month:02d}-{i + 1:02d}", f"pay {i}", "Bank")
+        else:
+            trans = services.add_transaction("alice", "expense", f"{i + 1}.25", "Food",
+                                             f"2024-{month:02d}-{i + 1:02d}",
+                                             f"uber eats {i}", "Card")
+        ids.append(trans["transaction_id"])
+    services.add_transaction("bob", "expense", "9.99", "Rent", "2024-02-01", "flat")
+    services.set_budget("alice", "Food", "40")
+    services.add_savings_goal("alice", "Bike", "500", "2025-01-01", "20")
+    services.edit_transaction("alice", ids[1], "75")
+    services.delete_transaction("alice", ids[2])
+    return ids
+
+
+def summary(username="alice"):
+    """Return every report and listing for a user in a comparable form."""
+    def rows(transactions):
+        return [(t["transaction_id"], t["type"], Decimal(t["amount"]), t["category"],
+                 t["date"], t["description"]) for t in transactions]
+
+    goals = [(g["name"], g["target"], g["current"]) for g in services.get_savings_goals(username)]
+    return {
+        "dashboard": services.get_dashboard(username, "2024-03"),
+        "budget": services.get_budget_status(username, "2024-02"),
+        "history": services.get_history(username, "2024-01", "2024-06"),
+        "list": rows(services.list_transactions(username)),
+        "search": rows(services.search_transactions(username, text="uber", min_amount="5")),
+        "goals": goals
+    }
+
+
+def test_changes_survive_restart(mode):
+    ids = add_sample_data()
+    before = summary()
+    restart()
+
+    assert sorted(config.users) == ["alice", "bob"]
+    assert services.authenticate("alice", "secret")
+    assert services.get_transaction("alice", ids[1])["amount"] == "75"
+    with pytest.raises(ValueError):
+        services.get_transaction("alice", ids[2])
+    assert summary() == before
+    assert len(services.list_transactions("bob")) == 1
+
+
+def test_results_match_across_modes(use_mode):
+    results = {}
+    for mode in MODES:
+        use_mode(mode)
+        add_sample_data()
+        restart()
+        results[mode] = summary()
+
+    for mode, result in results.items():
+        assert result == results["flat"], mode
+
+
+def test_saved_totals_are_exact(mode):
+    services.register_user("alice", "Alice", "secret")
+    for amount in ("0.10", "0.20", "0.35", "1000000000"):
+        services.add_transaction("alice", "expense", amount, "Food", "2024-05-05")
+    restart()
+
+    assert data_manager.get_month_totals("alice", "2024-05") == {
+        ("expense", "Food"): Decimal("1000000000.65")}
+
+
+def test_journal_replays_and_compacts(use_mode, monkeypatch):
+    use_mode("flat")
+    monkeypatch.setattr(config, "JOURNAL_COMPACT_THRESHOLD", 5)
+    services.register_user("alice", "Alice", "secret")
+    for day in range(1, 10):
+        services.add_transaction("alice", "expense", "1", "Food", f"2024-01-{day:02d}")
+
+    with open(config.JOURNAL_FILE) as f:
+        assert len(f.readlines()) < 5
+    restart()
+    assert len(services.list_transactions("alice")) == 9
+
+
+def test_torn_journal_line_is_skipped(use_mode):
+    use_mode("flat")
+    services.register_user("alice", "Alice", "secret")
+    services.add_transaction("alice", "expense", "1", "Food", "2024-01-01")
+    with open(config.JOURNAL_FILE, "a") as f:
+        f.write('{"s":"transactions","k":"TXN9')
+    services.add_transaction("alice", "expense", "2", "Food", "2024-01-02")
+    restart()
+
+    assert [t["amount"] for t in services.list_transactions("alice", newest_first=False)] == [
+        "1", "2"]
+
+
+def test_unreadable_store_is_not_overwritten(use_mode):
+    use_mode("flat")
+    services.register_user("alice", "Alice", "secret")
+    restart()
+    with open(config.TRANSACTIONS_FILE, "w") as f:
+        f.write("{not json")
+
+    with pytest.raises(ValueError):
+        services.list_transactions("alice")
+    data_manager.save_data()
+    with open(config.TRANSACTIONS_FILE) as f:
+        assert f.read() == "{not json"
+
+
+def test_failed_write_raises_and_is_undone(mode, monkeypatch):
+    services.register_user("alice", "Alice", "secret")
+    services.add_transaction("alice", "expense", "5", "Food", "2024-01-01")
+    services.get_dashboard("alice", "2024-01")
+
+    def fail(*args):
+        raise OSError("disk full")
+    monkeypatch.setattr(data_manager, "append_journal", fail)
+    monkeypatch.setattr(data_manager, "write_store_file", fail)
+    monkeypatch.setattr(data_manager.sqlite_store, "save_record", fail)
+
+    with pytest.raises(OSError):
+        services.add_transaction("alice", "expense", "7", "Food", "2024-01-02")
+    with pytest.raises(OSError):
+        services.set_budget("alice", "Food", "50")
+    assert [t["amount"] for t in services.list_transactions("alice")] == ["5"]
+    assert services.get_dashboard("alice", "2024-01")["expenses"] == Decimal("5")
+    assert config.budgets.get("alice") is None
+
+
+def test_record_file_serves_reports_after_restart(use_mode):
+    use_mode("recordfile")
+    add_sample_data()
+    expected = summary()
+    restart()
+
+    assert data_manager.records_usable("alice")
+    assert services.get_dashboard("alice", "2024-03") == expected["dashboard"]
+    assert services.get_history("alice", "2024-01", "2024-06") == expected["history"]
+
+
+REPO = os.path.dirname(os.path.abspath(data_manager.__file__))
+SETTINGS = ["STORAGE_BACKEND", "SHARDED", "USE_JOURNAL", "USE_RECORD_FILE", "PASSWORD_ITERATIONS"]
+
+
+def start_process(code, workdir):
+    """Start code in a new process with this test's settings and data directory."""
+    settings = {name: getattr(config, name) for name in SETTINGS}
+    script = (f"import sys; sys.path.insert(0, {REPO!r})\n"
+              "import config, data_manager, services\n"
+              f"for name, value in {settings!r}.items(): setattr(config, name, value)\n"
+              "data_manager.load_data()\n" + code)
+    return subprocess.Popen([sys.executable, "-c", script], cwd=workdir)
+
+
+def test_other_processes_changes_are_seen(mode, tmp_path):
+    services.register_user("alice", "Alice", "secret")
+    services.add_transaction("alice", "expense", "5", "Food", "2024-01-02", "coffee")
+    assert services.get_dashboard("alice", "2024-01")["expenses"] == Decimal("5")
+    assert services.search_transactions("alice", text="taxi") == []
+
+    child = start_process("services.add_transaction("
+                          "'alice', 'expense', '7', 'Food', '2024-01-03', 'taxi')\n",
+                          tmp_path / mode)
+    assert child.wait() == 0
+
+    assert services.get_dashboard("alice", "2024-01")["expenses"] == Decimal("12")
+    assert len(services.search_transactions("alice", text="taxi")) == 1
+    assert len(services.list_transactions("alice")) == 2
+
+
+@pytest.mark.parametrize("journal", [True, False])
+def test_processes_saving_together_keep_each_others_changes(use_mode, monkeypatch, journal):
+    workdir = use_mode("flat")
+    monkeypatch.setattr(config, "USE_JOURNAL", journal)
+    services.register_user("alice", "Alice", "secret")
+    services.register_user("bob", "Bob", "secret")
+
+    code = ("for day in range(1, 16):\n"
+            "    services.add_transaction({user!r}, 'expense', '1', 'Food', f'2024-01-{{day:02d}}')\n"
+            "services.set_budget({user!r}, 'Food', '10')\n"
+            "services.register_user({user!r} + '2', 'X', 'secret')\n")
+    children = [start_process(code.format(user=user), workdir) for user in ("alice", "bob")]
+    assert [child.wait() for child in children] == [0, 0]
+    restart()
+
+    assert sorted(config.users) == ["alice", "alice2", "bob", "bob2"]
+    for user in ("alice", "bob"):
+        assert len(services.list_transactions(user)) == 15
+        assert services.get_budget_status(user, "2024-01")[0]["spent"] == Decimal("15")
@@ -0,0 +1,36 @@
+"""Input validation helpers."""
+
+from decimal import Decimal
+
+import pytest
+
+from utils import validate_amount, validate_date, validate_month, validate_username
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("12", Decimal("12")), ("12.5", Decimal("12.5")), ("0.01", Decimal("0.01")),
+    ("0", None), ("-3", None), ("1.005", None), ("abc", None), ("NaN", None),
+    ("Infinity", None)])
+def test_validate_amount(text, expected):
+    assert validate_amount(text) == expected
+
+
+@pytest.mark.parametrize("text, valid", [
+    ("2024-02-29", True), ("2023-02-29", False), ("2024-2-03", False),
+    ("2024-02-3", False), ("24-02-03", False), ("2024-02-03 ", False)])
+def test_validate_date(text, valid):
+    assert bool(validate_date(text)) == valid
+
+
+@pytest.mark.parametrize("text, valid", [
+    ("2024-01", True), ("2024-12", True), ("2024-1", False), ("2024-13", False),
+    ("2024-00", False), ("202401", False)])
+def test_validate_month(text, valid):
+    assert bool(validate_month(text)) == valid
+
+
+@pytest.mark.parametrize("name, valid", [
+    ("alice", True), ("Alice Smith", True), ("", False), (".alice", False),
+    ("a/b", False), ("a..b", False), ("é" * 33, False)])
+def test_validate_username(name, valid):
+    assert validate_username(name) == valid
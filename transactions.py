@@ -5,15 +5,15 @@
 
 """Transaction CRUD operations and search functionality."""
 
-import datetime
-import uuid
 from decimal import Decimal
 import config
-from utils import (clear_screen, print_header, validate_amount, validate_date)
-from data_manager import save_data
+import services
+from instrumentation import instrumented
+from utils import clear_screen, print_header, validate_amount, validate_date
 
 
-def add_transaction():
+@instrumented
+def add_transaction(session):
     """Add a new transaction."""
     clear_screen()
     print_header("ADD TRANSACTION")
@@ -35,8 +35,7 @@ def add_transaction():
     
     # Amount
     amount_str = input("\nEnter amount: ").strip()
-    amount = validate_amount(amount_str)
-    if not amount:
+    if not validate_amount(amount_str):
         print("❌ Invalid amount!")
         input("\nPress Enter to continue...")
         return
@@ -56,89 +55,99 @@ def add_transaction():
     
     # Date
     date_str = input("\nEnter date (YYYY-MM-DD) or press Enter for today: ").strip()
-    if not date_str:
-        date_str = str(datetime.date.today())
-    elif not validate_date(date_str):
+    if date_str and not validate_date(date_str):
         print("❌ Invalid date format!")
         input("\nPress Enter to continue...")
         return
     
-    # Description
-    description = input("Enter description: ").strip() or "No description"
+    description = input("Enter description: ").strip()
+    payment_method = input("Payment method (Cash/Credit Card/Debit Card) [Cash]: ").strip()
     
-    # Payment method
-    payment_method = input("Payment method (Cash/Credit Card/Debit Card) [Cash]: ").strip() or "Cash"
-    
-    # Create transaction
-    trans_id = "TXN" + str(len(config.transactions) + 1).zfill(4)
-    transaction = {
-        "transaction_id": trans_id,
-        "user_id": config.users[config.current_user]["user_id"],
-        "username": config.current_user,
-        "type": trans_type,
-        "amount": str(amount),
-        "category": category,
-        "date": date_str,
-        "description": description,
-        "payment_method": payment_method
-    }
-    
-    config.transactions[trans_id] = transaction
-    save_data()
-    
-    print(f"\n✅ Transaction {trans_id} added successfully!")
-    input("\nPress Enter to continue...")
-
-
-def view_transactions():
-    """View all transactions for current user."""
-    clear_screen()
-    print_header("TRANSACTION LIST")
-    
-    user_transactions = {tid: t for tid, t in config.transactions.items() 
-                        if t["username"] == config.current_user}
-    
-    if not user_transactions:
-        print("No transactions found.")
+    try:
+        transaction = services.add_transaction(session.username, trans_type, amount_str,
+                                               category, date_str, description, payment_method)
+    except ValueError as e:
+        print(f"❌ {e}")
         input("\nPress Enter to continue...")
         return
     
-    # Sort by date
-    sorted_trans = sorted(user_transactions.items(), 
-                         key=lambda x: x[1]["date"], reverse=True)
-    
-    print("=" * 100)
-    print(f"{'ID':<12} | {'Date':<12} | {'Type':<8} | {'Category':<15} | {'Amount':>12}")
-    print("=" * 100)
-    
-    for tid, trans in sorted_trans:
-        amount = Decimal(trans["amount"])
-        symbol = config.users[config.current_user]["currency"]
-        print(f"{tid:<12} | {trans['date']:<12} | {trans['type']:<8} | "
-              f"{trans['category']:<15} | {symbol}{amount:>10,.2f}")
-    
-    print("=" * 100)
+    print(f"\n✅ Transaction {transaction['transaction_id']} added successfully!")
     input("\nPress Enter to continue...")
 
 
-def edit_transaction():
+@instrumented
+def view_transactions(session):
+    """Page through the session's transactions, newest first."""
+    page = services.page_transactions(session.username)
+    
+    while True:
+        page_size = page["page_size"]
+        clear_screen()
+        print_header("TRANSACTION LIST")
+        rows = page["transactions"]
+        
+        if not rows and not page["has_older"] and not page["has_newer"]:
+            print("No transactions found.")
+            input("\nPress Enter to continue...")
+            return
+        
+        print("=" * 100)
+        print(f"{'ID':<12} | {'Date':<12} | {'Type':<8} | {'Category':<15} | {'Amount':>12}")
+        print("=" * 100)
+        
+        for trans in rows:
+            tid = trans["transaction_id"]
+            amount = Decimal(trans["amount"])
+            symbol = session.currency
+            print(f"{tid:<12} | {trans['date']:<12} | {trans['type']:<8} | "
+                  f"{trans['category']:<15} | {symbol}{amount:>10,.2f}")
+        
+        print("=" * 100)
+        if rows:
+            print(f"Showing {len(rows)} transaction(s) from {rows[-1]['date']} to {rows[0]['date']}")
+        
+        options = []
+        if page["has_older"]:
+            options.append("[N]ext (older)")
+        if page["has_newer"]:
+            options.append("[P]revious (newer)")
+        options += ["[D]ate jump", f"[S]ize ({page_size})", "[Q]uit"]
+        choice = input("\n" + "  ".join(options) + ": ").strip().lower()
+        
+        try:
+            if choice == "n" and page["has_older"]:
+                page = services.page_transactions(session.username, page_size,
+                                                  before=(rows[-1]["date"], rows[-1]["transaction_id"]))
+            elif choice == "p" and page["has_newer"]:
+                page = services.page_transactions(session.username, page_size,
+                                                  after=(rows[0]["date"], rows[0]["transaction_id"]))
+            elif choice == "d":
+                date = input("Show transactions on or before (YYYY-MM-DD): ").strip()
+                page = services.page_transactions(session.username, page_size, before=date)
+            elif choice == "s":
+                size = input("Transactions per page: ").strip()
+                page = services.page_transactions(session.username, size)
+            elif choice == "q":
+                return
+        except ValueError as e:
+            print(f"❌ {e}")
+            input("\nPress Enter to continue...")
+
+
+@instrumented
+def edit_transaction(session):
     """Edit an existing transaction."""
     clear_screen()
     print_header("EDIT TRANSACTION")
     
     trans_id = input("Enter transaction ID: ").strip()
-    
-    if trans_id not in config.transactions:
-        print("❌ Transaction not found!")
-        input("\nPress Enter to continue...")
-        return
-    
-    if config.transactions[trans_id]["username"] != config.current_user:
-        print("❌ Access denied!")
+    try:
+        trans = services.get_transaction(session.username, trans_id)
+    except ValueError as e:
+        print(f"❌ {e}")
         input("\nPress Enter to continue...")
         return
     
-    trans = config.transactions[trans_id]
     print(f"\nCurrent details:")
     print(f"Type: {trans['type']}")
     print(f"Amount: {trans['amount']}")
@@ -148,45 +157,32 @@ def edit_transaction():
     
     print("\nLeave blank to keep current value")
     
-    # Edit amount
     new_amount = input(f"\nNew amount [{trans['amount']}]: ").strip()
-    if new_amount:
-        amount = validate_amount(new_amount)
-        if amount:
-            trans['amount'] = str(amount)
-    
-    # Edit description
     new_desc = input(f"New description [{trans['description']}]: ").strip()
-    if new_desc:
-        trans['description'] = new_desc
     
-    save_data()
+    services.edit_transaction(session.username, trans_id, new_amount, new_desc)
     print("\n✅ Transaction updated successfully!")
     input("\nPress Enter to continue...")
 
 
-def delete_transaction():
+@instrumented
+def delete_transaction(session):
     """Delete a transaction."""
     clear_screen()
     print_header("DELETE TRANSACTION")
     
     trans_id = input("Enter transaction ID: ").strip()
-    
-    if trans_id not in config.transactions:
-        print("❌ Transaction not found!")
-        input("\nPress Enter to continue...")
-        return
-    
-    if config.transactions[trans_id]["username"] != config.current_user:
-        print("❌ Access denied!")
+    try:
+        services.get_transaction(session.username, trans_id)
+    except ValueError as e:
+        print(f"❌ {e}")
         input("\nPress Enter to continue...")
         return
     
     confirm = input(f"\nAre you sure you want to delete {trans_id}? (yes/no): ").strip().lower()
     
     if confirm == "yes":
-        del config.transactions[trans_id]
-        save_data()
+        services.delete_transaction(session.username, trans_id)
         print("\n✅ Transaction deleted successfully!")
     else:
         print("\n❌ Deletion cancelled.")
@@ -194,7 +190,28 @@ def delete_transaction():
     input("\nPress Enter to continue...")
 
 
-def search_transactions():
+def ask_filters():
+    """Ask for every search filter; blank answers leave a filter out."""
+    print("Leave any field blank to skip it.\n")
+    filters = {
+        "start_date": input("Start date (YYYY-MM-DD): ").strip() or None,
+        "end_date": input("End date (YYYY-MM-DD): ").strip() or None,
+        "category": [c.strip() for c in input("Categories (comma separated): ").split(",")
+                     if c.strip()] or None,
+        "trans_type": input("Type (income/expense): ").strip().lower() or None,
+        "min_amount": input("Minimum amount: ").strip() or None,
+        "max_amount": input("Maximum amount: ").strip() or None,
+        "payment_method": input("Payment method: ").strip() or None,
+        "text": input("Description words: ").strip() or None
+    }
+    filters["sort"] = input("Sort by (date/amount/category) [date]: ").strip().lower() or "date"
+    filters["descending"] = input("Largest/newest first? (yes/no) [no]: ").strip().lower() == "yes"
+    filters["limit"] = input("Show at most (number of results): ").strip() or None
+    return filters
+
+
+@instrumented
+def search_transactions(session):
     """Search and filter transactions."""
     clear_screen()
     print_header("SEARCH TRANSACTIONS")
@@ -202,13 +219,12 @@ def search_transactions():
     print("1. Search by date range")
     print("2. Filter by category")
     print("3. Filter by amount range")
-    print("4. Back")
+    print("4. Search description / payment method")
+    print("5. Combined search")
+    print("6. Back")
     
     choice = input("\nSelect option: ").strip()
     
-    user_transactions = {tid: t for tid, t in config.transactions.items() 
-                        if t["username"] == config.current_user}
-    
     results = []
     
     if choice == "1":
@@ -220,23 +236,37 @@ def search_transactions():
             input("\nPress Enter to continue...")
             return
         
-        results = {tid: t for tid, t in user_transactions.items() 
-                  if start_date <= t["date"] <= end_date}
+        results = services.search_transactions(session.username,
+                                               start_date=start_date, end_date=end_date)
     
     elif choice == "2":
         category = input("Enter category: ").strip()
-        results = {tid: t for tid, t in user_transactions.items() 
-                  if t["category"].lower() == category.lower()}
+        results = services.search_transactions(session.username, category=category)
     
     elif choice == "3":
-        min_amount = input("Minimum amount: ").strip()
-        max_amount = input("Maximum amount: ").strip()
-        
-        min_amt = validate_amount(min_amount) or Decimal("0")
-        max_amt = validate_amount(max_amount) or Decimal("999999999")
+        min_amount = input("Minimum amount: ").strip() or None
+        max_amount = input("Maximum amount: ").strip() or None
         
-        results = {tid: t for tid, t in user_transactions.items() 
-                if min_amt <= Decimal(t["amount"]) <= max_amt}
+        try:
+            results = services.search_transactions(session.username, min_amount=min_amount,
+                                                   max_amount=max_amount)
+        except ValueError as e:
+            print(f"❌ {e}")
+            input("\nPress Enter to continue...")
+            return
+    
+    elif choice == "4":
+        print("All words must match; end a word with * to match a prefix (e.g. uber*)")
+        text = input("Search for: ").strip()
+        results = services.search_transactions(session.username, text=text)
+    
+    elif choice == "5":
+        try:
+            results = services.search_transactions(session.username, **ask_filters())
+        except ValueError as e:
+            print(f"❌ {e}")
+            input("\nPress Enter to continue...")
+            return
     
     else:
         return
@@ -253,9 +283,10 @@ def search_transactions():
         print(f"{'ID':<12} | {'Date':<12} | {'Type':<8} | {'Category':<15} | {'Amount':>12}")
         print("=" * 100)
         
-        for tid, trans in results.items():
+        for trans in results:
+            tid = trans["transaction_id"]
             amount = Decimal(trans["amount"])
-            symbol = config.users[config.current_user]["currency"]
+            symbol = session.currency
             print(f"{tid:<12} | {trans['date']:<12} | {trans['type']:<8} | "
                 f"{trans['category']:<15} | {symbol}{amount:>10,.2f}")
         
@@ -7,9 +7,15 @@
 
 import os
 import datetime
+import contextlib
+import re
 from decimal import Decimal
 
 
+DATE_PATTERN = re.compile(r"[0-9]{4}-[0-9]{2}-[0-9]{2}")
+MONTH_PATTERN = re.compile(r"[0-9]{4}-[0-9]{2}")
+
+
 def clear_screen():
     """Clear the console screen."""
     os.system('cls' if os.name == 'nt' else 'clear')
@@ -31,21 +37,94 @@ def print_box(content, width=80):
 
 
 def validate_amount(amount_str):
-    """Validate and convert amount string to Decimal."""
+    """Validate and convert amount string to Decimal.
+    
+    Amounts must be positive with at most two decimal places, so every
+    backend sums the same whole cents.
+    """
     try:
         amount = Decimal(amount_str)
-        if amount <= 0:
+        if amount <= 0 or amount != amount.quantize(Decimal("0.01")):
             return None
         return amount
     except:
         return None
 
 
+def validate_username(username):
+    """Validate a username that is also used as a shard directory name.
+    
+    Path separators, drive colons, NUL, a leading dot and ".." are
+    rejected so the name cannot point outside the data directory, and
+    it must fit the record file's 64-byte username field.
+    """
+    return (bool(username) and len(username.encode()) <= 64
+            and not username.startswith(".") and ".." not in username
+            and not any(char in username for char in "/\\:\0"))
+
+
 def validate_date(date_str):
-    """Validate date string in YYYY-MM-DD format."""
+    """Validate date string in YYYY-MM-DD format.
+    
+    Month and day must be zero-padded: dates are compared as strings and
+    parsed with date.fromisoformat.
+    """
     try:
+        if not DATE_PATTERN.fullmatch(date_str):
+            return False
         datetime.datetime.strptime(date_str, "%Y-%m-%d")
         return True
     except:
         return False
 
+
+def validate_month(month_str):
+    """Validate month string in YYYY-MM format.
+    
+    The month must be zero-padded, since months are compared as strings.
+    """
+    try:
+        if not MONTH_PATTERN.fullmatch(month_str):
+            return False
+        datetime.datetime.strptime(month_str, "%Y-%m")
+        return True
+    except:
+        return False
+
+
+def months_between(first, last):
+    """Return every YYYY-MM month from first to last inclusive."""
+    year, month = int(first[:4]), int(first[5:7])
+    months = []
+    while f"{year:04d}-{month:02d}" <= last:
+        months.append(f"{year:04d}-{month:02d}")
+        year, month = (year, month + 1) if month < 12 else (year + 1, 1)
+    return months
+
+
+def month_end(month):
+    """Return the last day of a YYYY-MM month as a date string."""
+    year, mon = int(month[:4]), int(month[5:7])
+    first_of_next = datetime.date(year + mon // 12, mon % 12 + 1, 1)
+    return (first_of_next - datetime.timedelta(days=1)).isoformat()
+
+
+@contextlib.contextmanager
+def file_lock(path):
+    """Hold an exclusive advisory lock on path for the duration of a block."""
+    with open(path, 'a+') as f:
+        if os.name == 'nt':
+            import msvcrt
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if os.name == 'nt':
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)